@@ -0,0 +1,53 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+import os, sys, timeit
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from diapyr import DI, types
+classes = []
+for i in range(100):
+    def init(self, *a): pass
+    classes.append(type('C%s' % i, (object,), {'__init__': types(*classes[-2:])(init)}))
+class Leaf:
+    @types()
+    def __init__(self): pass
+class Fake(Leaf):
+    def __init__(self): pass
+class Top:
+    @types(classes[-1], Leaf)
+    def __init__(self, c, leaf): pass
+objs = classes + [Leaf, Top]
+def rebuild():
+    di = DI()
+    di.addall(objs)
+    di.override(Leaf, Fake())
+    di(Top)
+    di.discardall()
+template = DI(); template.addall(objs); template(Top)
+def clone():
+    di = template.clone()
+    di.override(Leaf, Fake())
+    di(Top)
+    di.discardall()
+def clonereuse():
+    di = template.clone(classes)
+    di.override(Leaf, Fake())
+    di(Top)
+    di.discardall()
+for f in rebuild, clone, clonereuse:
+    n = 20
+    print(f.__name__, '%.2fms' % (min(timeit.repeat(f, number=n, repeat=3)) / n * 1000))
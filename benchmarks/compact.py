@@ -0,0 +1,41 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+'Usage: compact.py compact|plain'
+import gc, os, sys, time, tracemalloc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from diapyr import DI
+classes = [type('E%s' % i, (object,), {'__slots__': ['n']}) for i in range(5)]
+def make():
+    objs = []
+    for n in range(1000000):
+        o = classes[n % 5]()
+        o.n = n
+        objs.append(o)
+    return objs
+objs = make()
+compact = 'compact' == sys.argv[1]
+gc.collect()
+tracemalloc.start()
+t = time.time()
+di = DI(compact = compact)
+di.addall(objs)
+reg = time.time() - t
+current, _ = tracemalloc.get_traced_memory()
+t = time.time()
+n = len(di.all(object))
+print(sys.argv[1], 'registry %.1f MB' % (current / 1e6), 'addall %.2fs' % reg, 'all %.2fs' % (time.time() - t), n)
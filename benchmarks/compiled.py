@@ -0,0 +1,51 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+import os, sys, timeit
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from diapyr import DI, types
+class Config:
+    pass
+classes = []
+for i in range(50):
+    def init(self, config, *a): pass
+    def enhance(self, config): pass
+    ns = {'__init__': types(Config, *classes[-2:])(init)}
+    if i % 5 == 0:
+        ns['enhance'] = types(Config)(enhance)
+    classes.append(type('C%s' % i, (object,), ns))
+@types(Config, classes[-1], this = int)
+def factory(config, c):
+    return 1
+objs = classes + [factory]
+def container():
+    di = DI()
+    di.add(Config())
+    di.addall(objs)
+    di(int)
+    di.discardall()
+di = DI(); di.add(Config()); di.addall(objs); di(int)
+def rediscard():
+    di.discard(classes[0])
+    di(int)
+child = DI(di)
+child.add(classes[-1])
+def childscope():
+    c = DI(di); c.add(classes[-1]); c(classes[-1]); c.discardall()
+for f in container, rediscard, childscope:
+    n = 200
+    print(f.__name__, '%.1fus' % (min(timeit.repeat(f, number=n, repeat=5)) / n * 1e6))
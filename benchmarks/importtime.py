@@ -0,0 +1,28 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+'Compare import time of an app that imports its dependencies eagerly with one that names them as strings.'
+import os, re, subprocess, sys
+benchmarks = os.path.dirname(os.path.abspath(__file__))
+appdir = os.path.join(benchmarks, 'importtime')
+env = dict(os.environ, PYTHONPATH = os.pathsep.join([appdir, os.path.dirname(benchmarks)]))
+def cumulative(module):
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import %s' % module], env = env, stderr = subprocess.PIPE, universal_newlines = True, check = True).stderr
+    us, = (int(m.group(1)) for m in re.finditer(r'^import time:\s+\d+ \|\s+(\d+) \| %s$' % module, stderr, re.MULTILINE))
+    return us
+for module in 'eager', 'lazy':
+    print(module, '%.1fms' % (min(cumulative(module) for _ in range(5)) / 1e3))
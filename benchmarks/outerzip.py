@@ -0,0 +1,51 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+import os, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from diapyr.util import outerzip
+class Old:
+    class Session:
+        def __init__(self, iterables):
+            self.iterators = [iter(i) for i in iterables]
+        def row(self):
+            self.validrow = len(self.iterators)
+            for i in self.iterators:
+                try:
+                    yield next(i)
+                except StopIteration:
+                    self.validrow -= 1
+                    yield
+    def __call__(self, *iterables):
+        session = self.Session(iterables)
+        while True:
+            values = tuple(session.row())
+            if not session.validrow:
+                break
+            yield values
+n = 2000000
+a, b, c = list(range(n)), [float(i) for i in range(n - 1000)], list(range(n // 2))
+def t(f):
+    start = time.perf_counter(); f(); return time.perf_counter() - start
+def consume(it):
+    for _ in it: pass
+def sumchunks(**kw):
+    for cols in outerzip.chunked(65536, a, b, c, **kw): pass
+print('old %.0fms' % (1e3 * min(t(lambda: consume(Old()(a, b, c))) for _ in range(2))))
+print('new %.0fms' % (1e3 * min(t(lambda: consume(outerzip(a, b, c))) for _ in range(3))))
+print('chunked lists %.0fms' % (1e3 * min(t(lambda: sumchunks()) for _ in range(3))))
+print('chunked arrays %.0fms' % (1e3 * min(t(lambda: sumchunks(typecode = 'd')) for _ in range(3))))
@@ -0,0 +1,34 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+import os, sys, timeit
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from diapyr import DI, types
+types_ = [type('T%s' % i, (object,), dict(__init__ = types()(lambda self: None))) for i in range(200)]
+class B:
+    @types()
+    def __init__(self): pass
+sub = DI()
+for t in types_: sub.add(t)
+sub.add(B)
+di = DI()
+sub.parent = di
+sub.join(B)
+di(B)
+print(min(timeit.repeat(lambda: di(B), number = 20000, repeat = 5)) / 20000 * 1e6, 'us')
+proxy, = di.allsources
+print(min(timeit.repeat(lambda: proxy.instance, number = 200000, repeat = 5)) / 200000 * 1e9, 'ns proxy.instance')
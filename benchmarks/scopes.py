@@ -0,0 +1,47 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio, os, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from diapyr import DI, types
+class App:
+    @types()
+    def __init__(self): pass
+class Request:
+    @types(App)
+    def __init__(self, app): pass
+app = DI(); app.add(App); app(App)
+scope = app.scope(lambda c: c.add(Request))
+async def ambient():
+    scope(Request); scope(Request)
+async def explicit():
+    c = DI(app); c.add(Request)
+    try:
+        c(Request); c(Request)
+    finally:
+        c.discardall()
+async def bare():
+    pass
+def run(f, n = 20000, concurrency = 2000):
+    async def main():
+        for _ in range(n // concurrency):
+            await asyncio.gather(*[f() for _ in range(concurrency)])
+    start = time.perf_counter()
+    asyncio.run(main())
+    return n / (time.perf_counter() - start)
+for f in bare, explicit, ambient:
+    print(f.__name__, '%.0f tasks/s' % max(run(f) for _ in range(3)))
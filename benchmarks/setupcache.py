@@ -0,0 +1,36 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+import os, sys, tempfile, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from setuphacks import getsetupkwargsall, SetupCache
+tempdir = tempfile.mkdtemp()
+paths = []
+for i in range(100):
+    d = os.path.join(tempdir, str(i)); os.mkdir(d)
+    p = os.path.join(d, 'setup.py'); paths.append(p)
+    with open(p, 'w') as f:
+        f.write("from setuptools import setup, find_packages\nsetup(name = 'p%s', version = '1', packages = find_packages())\n" % i)
+fields = ['name', 'version']
+cache = SetupCache(os.path.join(tempdir, 'cache'))
+def t(f):
+    start = time.perf_counter(); r = list(f()); return time.perf_counter() - start, r
+a, ra = t(lambda: getsetupkwargsall(paths, fields))
+b, rb = t(lambda: cache.getsetupkwargsall(paths, fields))
+c, rc = t(lambda: cache.getsetupkwargsall(paths, fields))
+assert ra == rb == rc
+print('uncached %.0fms, cold %.0fms, warm %.1fms' % (a * 1e3, b * 1e3, c * 1e3))
@@ -0,0 +1,53 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+import os, sys, threading, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from diapyr import DI
+class LockedDI(DI):
+    def getsources(self, type):
+        with self.lock:
+            return list(self.typetosources.get(type, ()))
+class T: pass
+def run(cls, readers = 4, seconds = 1.0):
+    di = cls()
+    for _ in range(20):
+        di.add(T())
+    stop = []
+    counts = []
+    def read():
+        n = 0
+        while not stop:
+            di.getsources(T); di.getsources(T); di.getsources(T); di.getsources(T)
+            n += 4
+        counts.append(n)
+    writes = [0]
+    def write():
+        while not stop:
+            di.add(T())
+            di.removesource(di.typetosources[T][0])
+            writes[0] += 1
+            time.sleep(0.0005)
+    threads = [threading.Thread(target = read) for _ in range(readers)] + [threading.Thread(target = write)]
+    for t in threads: t.start()
+    time.sleep(seconds)
+    stop.append(1)
+    for t in threads: t.join()
+    return sum(counts) / seconds, writes[0] / seconds
+for cls in DI, LockedDI:
+    r, w = run(cls)
+    print(cls.__name__, '%.0f reads/s' % r, '%.0f writes/s' % w)
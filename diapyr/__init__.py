@@ -16,9 +16,13 @@
 # along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
 
 from .diapyr import DI, types
-from .iface import MissingAnnotationException, UnsatisfiableRequestException
+from .iface import DuplicateRegistrationException, MissingAnnotationException, TimeoutException, UnsatisfiableRequestException
+from .match import Ref
 
 assert DI
+assert DuplicateRegistrationException
 assert MissingAnnotationException
+assert Ref
+assert TimeoutException
 assert types
 assert UnsatisfiableRequestException
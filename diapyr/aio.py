@@ -0,0 +1,77 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+from .iface import unset
+from .util import _rootcontext
+from functools import partial
+import asyncio, inspect
+
+async def aiterall(di, type, ordered, executor):
+    loop = asyncio.get_running_loop()
+    iterator = di.iterall(type, ordered)
+    while True:
+        instance = await loop.run_in_executor(executor, next, iterator, unset)
+        if instance is unset:
+            break
+        yield instance
+
+async def aenter(di):
+    return di
+
+async def aexit(di):
+    try:
+        await di.adiscardall()
+    finally:
+        if di.watchdog is not None:
+            di.watchdog.stop()
+
+async def adiscardall(di):
+    layers = di._disposallayers()
+    stoplayers, di.startedlayers = di.startedlayers, []
+    di.dependencies.clear()
+    di.dependents.clear()
+    di.maketimes.clear()
+    loop = asyncio.get_running_loop()
+    failure = None
+    def fail(e):
+        _rootcontext(e).__context__ = failure
+        return e
+    for k in di.keyed.values():
+        try:
+            k.discardall()
+        except Exception as e:
+            failure = fail(e)
+    for l in reversed(stoplayers):
+        try:
+            await loop.run_in_executor(None, partial(di._stoplayer, l))
+        except Exception as e:
+            failure = fail(e)
+    for layer in layers:
+        awaitables = []
+        for s in layer:
+            try:
+                result = di._discarder(s)()
+            except Exception as e:
+                failure = fail(e)
+            else:
+                if inspect.isawaitable(result):
+                    awaitables.append(result)
+        for result in await asyncio.gather(*awaitables, return_exceptions = True):
+            if isinstance(result, Exception):
+                failure = fail(result)
+    if failure is not None:
+        raise failure
@@ -0,0 +1,77 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+from .diapyr import DI, types
+from unittest import TestCase
+import asyncio, threading
+
+class Handler: pass
+
+class TestAio(TestCase):
+
+    def test_aiterall(self):
+        threads = set()
+        class A(Handler):
+            @types()
+            def __init__(self): threads.add(threading.current_thread())
+        class B(Handler):
+            @types(A)
+            def __init__(self, a): threads.add(threading.current_thread())
+        di = DI()
+        di.add(B)
+        di.add(A)
+        async def collect(ordered):
+            return [h.__class__ async for h in di.aiterall(Handler, ordered)]
+        self.assertEqual([A, B], asyncio.run(collect(False)))
+        self.assertEqual([B, A], asyncio.run(collect(True)))
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_adiscardall(self):
+        events = []
+        class X(Exception): pass
+        class Y(Exception): pass
+        class Pool:
+            @types()
+            def __init__(self): pass
+            def dispose(self): events.append('Pool')
+        class Service:
+            @types(Pool)
+            def __init__(self, pool): pass
+            async def dispose(self):
+                name = self.__class__.__name__
+                events.append(name + '.begin')
+                await asyncio.sleep(.01)
+                events.append(name + '.end')
+                if 'Bad' == name:
+                    raise Y
+        class Good(Service): pass
+        class Bad(Service): pass
+        class Sync:
+            @types(Pool)
+            def __init__(self, pool): pass
+            def dispose(self): raise X
+        async def main():
+            async with DI() as di:
+                di.add(Pool)
+                di.add(Good)
+                di.add(Bad)
+                di.add(Sync)
+                di.all(object)
+        with self.assertRaises(Y) as cm:
+            asyncio.run(main())
+        self.assertIs(X, cm.exception.__context__.__class__)
+        self.assertEqual(['Bad.begin', 'Good.begin', 'Bad.end', 'Good.end', 'Pool'], events)
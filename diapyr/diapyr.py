@@ -15,13 +15,20 @@
 # You should have received a copy of the GNU General Public License
 # along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
 
-from .iface import ImpasseException, MissingAnnotationException, unset
-from .match import AllInstancesOf, wrap
-from .source import Builder, Class, Factory, Instance, Proxy
-from .start import starter
-from .util import invokeall, singleton
+from .graph import Graph
+from .iface import DuplicateRegistrationException, ImpasseException, MissingAnnotationException, TimeoutException, UnsatisfiableRequestException, unset
+from .keyed import Keyed
+from .match import AllInstancesOf, Ref, resolvetype, SourceArg, wrap
+from .plugin import entrypoints, typename
+from .profiling import Profiler
+from .source import Bucket, Builder, Class, Creator, Factory, Instance, Proxy, Remote
+from .start import Started, starter
+from .stats import prometheus, Stats, writeprometheus
+from .util import invokeall, monotonic, singleton
+from .watchdog import Watchdog
 from collections import defaultdict, OrderedDict
-import logging
+from functools import partial
+import logging, threading
 
 log = logging.getLogger(__name__)
 typeitself = type
@@ -42,51 +49,246 @@ def types(*deptypes, **kwargs):
         return f
     return g
 
+def _origins(source):
+    if isinstance(source, Instance):
+        yield source.instance
+    elif isinstance(source, Bucket):
+        for i in source.instances:
+            yield i
+    elif isinstance(source, Class):
+        yield source.type
+    elif isinstance(source, Factory):
+        yield source.instantiator.function
+
+def _requestpath(requestedby, source):
+    labels = []
+    while source is not None:
+        labels.append(source.typelabel)
+        source = requestedby[source]
+    return ' > '.join(reversed(labels))
+
 class DI:
 
     log = log # Tests may override.
     depthunit = '>'
 
-    def __init__(self, parent = None):
-        self.typetosources = defaultdict(list)
+    def __init__(self, parent = None, executor = None, compact = False):
+        self.typetosources = defaultdict(list) # Only touched by writers and publishers, under the lock.
+        self.snapshot = {} # Immutable tuple per type, read without locking.
+        self.lock = threading.Lock()
         self.allsources = [] # Old-style classes won't be registered against object.
+        self.version = 0 # Bumped on every registry change.
         self.parent = parent
+        self.executor = executor
+        self.buckets = {} if compact else None
+        self.startedlayers = []
+        self.starting = {} # Source to future of its start, so that a retry after a timeout waits for it instead of starting again.
+        self.dependencies = OrderedDict()
+        self.dependents = defaultdict(list)
+        self.maketimes = {}
+        self.keyed = {}
+        self.deferred = defaultdict(list)
+        self.undeferred = set()
+        self.deferlock = threading.RLock() # Separate from the lock as undeferring adds, and reentrant in case an import resolves.
+        self.metrics = Stats()
+        self.profiler = None
+        self.watchdog = None
+        self.sharedindex = False
+        self.owned = None # Otherwise map from template source to own copy.
+
+    def clone(self, reuse = ()):
+        '''Return a container with the same registrations that initially shares this one's index, copying it on first write by either.
+        Sources are copied on first lookup, and already-created instances of the reuse types are shared instead of created again.
+        Shared instances are never disposed by the clone.'''
+        di = DI(self.parent, self.executor, self.buckets is not None)
+        if 'log' in self.__dict__:
+            di.log = self.log
+        self.sharedindex = di.sharedindex = True
+        di.typetosources = self.typetosources
+        di.snapshot = self.snapshot # Shared index is never written so its snapshot stays valid.
+        di.allsources = self.allsources
+        di.owned = {}
+        di.base = {} if self.owned is None else self.owned
+        di.reuse = tuple(reuse)
+        if self.buckets is not None:
+            self.buckets = {} # Existing buckets may now be seen by the clone.
+        for type, k in self.keyed.items():
+            di.keyed[type] = Keyed(k.function, k.maxsize, di)
+        with self.deferlock:
+            for name, names in self.deferred.items():
+                di.deferred[name].extend(names)
+            di.undeferred.update(self.undeferred)
+        return di
+
+    def _unshare(self):
+        if self.sharedindex:
+            self.typetosources = defaultdict(list, ((t, list(l)) for t, l in self.typetosources.items()))
+            self.snapshot = dict(self.snapshot)
+            self.allsources = list(self.allsources)
+            self.sharedindex = False
+
+    def _own(self, source):
+        try:
+            return self.owned[source]
+        except KeyError:
+            self.owned[source] = copy = self.base.get(source, source).clone(self, self.reuse)
+            return copy
+
+    def _ownedsources(self):
+        if self.owned is None:
+            return self.allsources
+        return [self.owned[s] for s in self.allsources if s in self.owned]
 
     def addsource(self, source):
-        for type in source.types:
-            self.typetosources[type].append(source)
-        self.allsources.append(source)
+        with self.lock:
+            self._unshare()
+            if self.owned is not None:
+                self.owned[source] = source
+            for type in source.types:
+                self.typetosources[type].append(source)
+                self.snapshot.pop(type, None)
+            self.allsources.append(source)
+            self.version += 1
+
+    def getsources(self, type):
+        if self.deferred:
+            self._undefer(type)
+        try:
+            sources = self.snapshot[type]
+        except KeyError:
+            sources = self._publish(type)
+        if self.owned is None:
+            return sources
+        return [self._own(s) for s in sources]
+
+    def _publish(self, type):
+        with self.lock:
+            self.snapshot[type] = sources = tuple(self.typetosources.get(type, ()))
+        return sources
+
+    def _undefer(self, type):
+        key = typename(type)
+        if key in self.deferred:
+            with self.deferlock:
+                names = self.deferred.get(key) # Again, another thread may have undeferred it meanwhile.
+                if names is not None:
+                    while names:
+                        obj = Ref(names[0]).resolve() # If this fails the name stays for a later lookup.
+                        if obj not in self.undeferred: # Same object may be declared for multiple types.
+                            self.add(obj)
+                            self.undeferred.add(obj)
+                        names.pop(0)
+                    del self.deferred[key]
+
+    def defer(self, typename, name):
+        with self.deferlock:
+            self.deferred[typename].append(name)
+
+    def discover(self, group):
+        for ep in entrypoints(group):
+            self.defer(ep.name.replace(':', '.'), ep.value)
 
     def removesource(self, source): # TODO: Untested.
-        for type in source.types:
-            self.typetosources[type].remove(source)
-        self.allsources.remove(source)
+        with self.lock:
+            self._unshare()
+            if self.owned is not None:
+                self.owned.pop(source, None)
+            for type in source.types:
+                self.typetosources[type].remove(source)
+                self.snapshot.pop(type, None)
+            self.allsources.remove(source)
+            if self.buckets is not None and self.buckets.get(source.type) is source:
+                del self.buckets[source.type] # Further instances need a registered bucket.
+            self.version += 1
 
     def addclass(self, clazz):
+        for s in self._classsources(clazz, {}, {}):
+            self.addsource(s)
+
+    def _classsources(self, clazz, closures, builders):
         try:
             clazz.__init__.di_deptypes
         except AttributeError:
             raise MissingAnnotationException("Missing types annotation: %s" % clazz)
-        self.addsource(Class(clazz, self))
-        self._addbuilders(clazz)
+        yield Class(clazz, self, closures)
+        for s in self._buildersources(clazz, closures, builders):
+            yield s
         if getattr(clazz, 'start', None) is not None:
-            self.addclass(starter(clazz))
+            for s in self._classsources(starter(clazz), closures, builders):
+                yield s
+
+    def addremote(self, clazz):
+        '''Add the class to be built in a worker process, its dependencies must be picklable.'''
+        try:
+            clazz.__init__.di_deptypes
+        except AttributeError:
+            raise MissingAnnotationException("Missing types annotation: %s" % clazz)
+        self.addsource(Remote(clazz, self))
+        methods = self._buildermethods(clazz, {})
+        if methods:
+            from .remote import builder
+            for name, m in methods:
+                self.addsource(Builder(clazz, builder(name, m), self))
+        if getattr(clazz, 'start', None) is not None: # The proxy forwards start and stop.
+            for s in self._classsources(starter(clazz), {}, {}):
+                self.addsource(s)
+
+    def _buildermethods(self, cls, builders):
+        try:
+            return builders[cls]
+        except KeyError:
+            builders[cls] = methods = []
+            for name in dir(cls):
+                m = getattr(cls, name)
+                if hasattr(m, 'di_deptypes') and hasattr(m, 'di_owntype'):
+                    assert '__init__' != name # TODO LATER: Check upfront.
+                    methods.append([name, m])
+            return methods
 
-    def _addbuilders(self, cls):
-        for name in dir(cls):
-            m = getattr(cls, name)
-            if hasattr(m, 'di_deptypes') and hasattr(m, 'di_owntype'):
-                assert '__init__' != name # TODO LATER: Check upfront.
-                self.addsource(Builder(cls, m, self))
+    def _buildersources(self, cls, closures, builders):
+        for _, m in self._buildermethods(cls, builders):
+            yield Builder(cls, m, self, closures)
 
     def addinstance(self, instance, type = None):
+        staged = OrderedDict()
+        self._index(list(self._instancesources(instance, {}, {}, staged, type)), staged)
+
+    def _instancesources(self, instance, closures, builders, staged, type = None):
         clazz = instance.__class__ if type is None else type
-        self.addsource(Instance(instance, clazz))
+        if self.buckets is not None and not isinstance(instance, typeitself) and not self._buildermethods(clazz, builders):
+            try:
+                entry = staged[clazz]
+            except KeyError:
+                staged[clazz] = entry = [self.buckets.get(clazz), []]
+                if entry[0] is None:
+                    entry[0] = bucket = Bucket(clazz, closures)
+                    yield bucket
+            entry[1].append(instance) # Not in the bucket until the index step, in case the batch fails.
+            return
+        yield Instance(instance, clazz, closures)
         if not isinstance(instance, typeitself):
-            self._addbuilders(clazz)
+            for s in self._buildersources(clazz, closures, builders):
+                yield s
 
     def addfactory(self, factory):
-        self.addsource(Factory(factory, self))
+        for s in self._factorysources(factory, {}, {}):
+            self.addsource(s)
+
+    def _factorysources(self, factory, closures, builders):
+        yield Factory(factory, self, closures)
+
+    def addkeyedfactory(self, factory, maxsize = 128):
+        keyed = Keyed(factory, maxsize, self)
+        self.keyed[keyed.type] = keyed
+
+    def _getkeyed(self, type):
+        di = self
+        while di is not None:
+            try:
+                return di.keyed[type]
+            except KeyError:
+                di = di.parent
+        raise UnsatisfiableRequestException("No keyed factory for type: %s" % type)
 
     def _addmethods(self, obj):
         if hasattr(obj, 'di_owntype'):
@@ -111,45 +313,354 @@ class DI:
         for m in self._addmethods(obj):
             m(obj)
 
+    def addall(self, objs, unique = False):
+        '''Add each object as if by add, but classify them all before indexing their sources in one pass.
+        Metadata such as type closures and builder methods is gathered once per class.'''
+        closures = {}
+        builders = {}
+        staged = OrderedDict() # Bucket class to the bucket and its new instances.
+        sourcesmethods = {
+            self.addclass: self._classsources,
+            self.addfactory: self._factorysources,
+            self.addinstance: partial(self._instancesources, staged = staged),
+        }
+        if unique:
+            seen = set(id(o) for s in self.allsources for o in _origins(s))
+        sources = []
+        for obj in objs:
+            if unique:
+                if id(obj) in seen:
+                    raise DuplicateRegistrationException("Already registered: %r" % (obj,))
+                seen.add(id(obj))
+            for m in self._addmethods(obj):
+                sources.extend(sourcesmethods[m](obj, closures, builders))
+        self._index(sources, staged)
+
+    def _index(self, sources, staged):
+        index = defaultdict(list)
+        for s in sources:
+            for type in s.types:
+                index[type].append(s)
+        with self.lock:
+            self._unshare()
+            if self.owned is not None:
+                self.owned.update((s, s) for s in sources)
+            for type, typesources in index.items():
+                self.typetosources[type].extend(typesources)
+                self.snapshot.pop(type, None)
+            self.allsources.extend(sources)
+            for clazz, (bucket, instances) in staged.items():
+                self.buckets[clazz] = bucket
+                bucket.instances.extend(instances)
+            self.version += 1
+
     def all(self, type):
         return self._session(AllInstancesOf(type))
 
-    def __call__(self, clazz):
+    def iterall(self, type, ordered = False):
+        '''Like all but yield each object as soon as it has been created, after planning the whole graph once.
+        Unless ordered, objects needing the fewest creations are yielded first.'''
+        root = AllInstancesOf(type).di_get(self, unset)
+        plans, requestedby = self._plan([root])
+        def needed(source):
+            order = []
+            seen = set()
+            def visit(s):
+                if s in plans and s not in seen:
+                    seen.add(s)
+                    for a in plans[s].args:
+                        for r in a.sources:
+                            visit(r)
+                    order.append(s)
+            visit(source)
+            return order
+        sources = list(root.sources)
+        if not ordered:
+            sources.sort(key = lambda s: len(needed(s))) # Stable.
+        for source in sources:
+            batch = OrderedDict()
+            for s in needed(source):
+                p = plans.pop(s)
+                if p is not NullPlan and s.instance is unset: # Otherwise made by the consumer since planning.
+                    batch[s] = p
+            self._makeplans(batch, requestedby)
+            if source.multiple:
+                for instance in source.instances:
+                    yield instance
+            else:
+                yield source.instance
+
+    def aiterall(self, type, ordered = False, executor = None):
+        '''Asynchronous iterator version of iterall, objects are created via the given executor or the loop's default.'''
+        from .aio import aiterall
+        return aiterall(self, type, ordered, executor)
+
+    def scope(self, configure = None):
+        '''Return a facility that lazily gives each asyncio task its own child container, discarded via adiscardall in a new task once the task is done.
+        The configure function, if any, is called once with a template child e.g. to add request-scoped classes, and each task gets a clone of it.'''
+        from .scope import Scope
+        return Scope(self, configure)
+
+    def __call__(self, clazz, key = unset):
+        if key is not unset:
+            return self._getkeyed(resolvetype(clazz)).get(key)
         return self._session(wrap(clazz))
 
+    def cacheinfo(self, type):
+        return self._getkeyed(resolvetype(type)).cacheinfo()
+
+    def resolveall(self, types):
+        return self._sessionall([wrap(t) for t in types])
+
     def _session(self, match):
-        root = match.di_get(self, unset)
+        return self._sessionall([match])[0]
+
+    def _sessionall(self, matches):
+        self.metrics.resolutions += len(matches)
+        roots = [m.di_get(self, unset) for m in matches]
+        self._build(roots)
+        return [r.resolve() for r in roots]
+
+    def _build(self, args):
+        plans, requestedby = self._plan(args)
+        self._makeplans(plans, requestedby)
+
+    def _plan(self, args):
+        start = monotonic()
         depth = self.depthunit
         plans = OrderedDict()
-        args = [root]
+        requestedby = {}
+        args = [[None, a] for a in args]
         while args:
             nextargs = []
-            for a in args:
+            for requester, a in args:
                 for s in a.sources:
                     if s not in plans:
                         p = s.plan(depth, a.trigger)
+                        self.metrics.planned(s, p)
                         if p is None:
                             p = NullPlan
                         plans[s] = p
-                        nextargs.extend(p.args)
+                        requestedby[s] = requester
+                        nextargs.extend([s, x] for x in p.args)
             args = nextargs
             depth = "%s%s" % (depth, self.depthunit)
+        self.metrics.planseconds += monotonic() - start
+        for s, p in plans.items():
+            if p is not NullPlan:
+                getattr(s, 'di', self)._record(s, [r for a in p.args for r in a.sources]) # The owner, so e.g. its replace sees the edges.
+        return plans, requestedby
+
+    def _makeplans(self, plans, requestedby):
         while plans:
             sources = [s for s in plans if not any(r in plans for a in plans[s].args for r in a.sources)]
             if not sources:
                 raise ImpasseException
-            for s in sources:
-                plans.pop(s).make()
-        return root.resolve()
+            self._makeall([[s, plans.pop(s)] for s in sources], requestedby)
+
+    def _record(self, source, dependencies):
+        self._forget(source)
+        self.dependencies[source] = dependencies
+        for d in dependencies:
+            self.dependents[d].append(source)
+
+    def _forget(self, source):
+        for d in self.dependencies.pop(source, ()):
+            self.dependents[d].remove(source)
+        self.maketimes.pop(source, None)
+
+    def _subgraph(self, sources):
+        '''Return the given sources and their transitive dependents, each after its dependencies.'''
+        order = []
+        seen = set()
+        def visit(source):
+            if source not in seen:
+                seen.add(source)
+                for d in self.dependents.get(source, ()):
+                    visit(d)
+                order.append(source)
+        for s in reversed(sources):
+            visit(s)
+        order.reverse()
+        return order
+
+    def _make(self, source, plan, requestedby):
+        if plan is NullPlan:
+            return
+        start = monotonic()
+        if self.watchdog is None:
+            self._profiledmake(source, plan)
+        else:
+            with self.watchdog.watching('make', source.typelabel, partial(_requestpath, requestedby, source)):
+                self._profiledmake(source, plan)
+        owner = getattr(source, 'di', self)
+        owner.maketimes[source] = seconds = monotonic() - start
+        owner.metrics.made(source, seconds) # Like disposals and live, so that they add up.
+
+    def _profiledmake(self, source, plan):
+        if self.profiler is None:
+            plan.make()
+        else:
+            self.profiler.make(source, plan)
+
+    def _makeall(self, sourceplans, requestedby):
+        started = [] if self.executor is None else [[s, partial(self._make, s, p, requestedby)] for s, p in sourceplans if issubclass(s.type, Started)]
+        if not started:
+            for s, p in sourceplans:
+                self._make(s, p, requestedby)
+            return
+        owned = set(self._ownedsources())
+        self.startedlayers.append([s for s, _ in started if s in owned]) # Not those of a parent, its discardall will stop them.
+        futures = []
+        for s, task in started:
+            future = self.starting.get(s)
+            if future is None:
+                self.starting[s] = future = self.executor.submit(task)
+                future.add_done_callback(lambda f, s = s: self.starting.pop(s, None))
+            futures.append([s, future])
+        waits = self._waiters(futures, 'start')
+        def makerest():
+            for s, p in sourceplans:
+                if not issubclass(s.type, Started):
+                    self._make(s, p, requestedby)
+        invokeall([makerest] + waits)
+
+    def _submitall(self, tasks, verb):
+        return self._waiters([[s, self.executor.submit(task)] for s, task in tasks], verb)
+
+    def _waiters(self, futures, verb):
+        from concurrent.futures import TimeoutError
+        submitted = monotonic()
+        def waiter(source, future):
+            def wait():
+                timeout = getattr(source.type, verb + 'timeout')
+                try:
+                    return future.result(None if timeout is None else max(0, submitted + timeout - monotonic()))
+                except TimeoutError:
+                    raise TimeoutException("Failed to %s within %ss: %s" % (verb, timeout, source.typelabel))
+            return wait
+        return [waiter(s, f) for s, f in futures]
+
+    def _stoplayer(self, sources):
+        invokeall(self._submitall([[s, self._discarder(s)] for s in sources], 'stop'))
+
+    def _discarder(self, source):
+        return source.discard if self.watchdog is None else partial(self._watcheddiscard, source)
+
+    def _watcheddiscard(self, source):
+        with self.watchdog.watching('discard', source.typelabel, lambda: source.typelabel):
+            return source.discard()
+
+    def stats(self):
+        return self.metrics.snapshot(sum(1 for s in self._ownedsources() if isinstance(s, Creator) and s.instance is not unset))
+
+    def prometheus(self, prefix = 'diapyr'):
+        return prometheus(self.stats(), prefix)
+
+    def writeprometheus(self, path, prefix = 'diapyr'):
+        writeprometheus(self.stats(), path, prefix)
+
+    def profile(self):
+        if self.profiler is None:
+            self.profiler = Profiler()
+        return self.profiler
+
+    def watch(self, threshold, interval = None):
+        '''Start a background thread that logs any single make or discard taking longer than threshold seconds.'''
+        if self.watchdog is None:
+            self.watchdog = Watchdog(self.log, threshold, interval)
+        return self.watchdog
+
+    def graph(self):
+        return Graph(self.dependencies, self.maketimes)
+
+    def replace(self, old, new):
+        sources = []
+        for s in (self.allsources if self.owned is None else [self._own(s) for s in self.allsources]):
+            if isinstance(s, Bucket):
+                sources.extend(s.slot(i) for i, o in enumerate(s.instances) if o is old)
+            elif not isinstance(s, Proxy) and s.instance is old:
+                sources.append(s)
+        if not sources:
+            raise UnsatisfiableRequestException("Not an object of this container: %r" % (old,))
+        dependents = [s for s in self._subgraph(sources) if s not in sources and s.instance is not unset]
+        self._discardsubgraph(dependents)
+        for s in sources:
+            s.setinstance(new)
+        self._build([SourceArg(s, s.type) for s in dependents])
+
+    def override(self, type, obj):
+        '''Replace all sources of the given type with the given object, discarding anything already created from them.'''
+        with self.lock:
+            sources = list(self.typetosources.get(type, ()))
+        self._discardsubgraph(self._subgraph(self.getsources(type)))
+        for s in sources:
+            self.removesource(s)
+        self.add(obj)
+
+    def discard(self, type):
+        self._discardsubgraph(self._subgraph(wrap(type).getsources(self)))
+
+    def _discardsubgraph(self, sources):
+        for s in sources:
+            self._forget(s)
+        invokeall([self._discarder(s) for s in reversed(sources)])
 
     def join(self, type, discardall = True):
         self.parent.addsource(Proxy(self, type, discardall))
 
+    def joinall(self, types, discardall = True):
+        for type in types:
+            self.join(type, discardall)
+
+    def _disposallayers(self):
+        '''Group the sources into layers such that each only depends on sources in later layers.'''
+        sources = list(reversed(self._ownedsources()))
+        pending = dict((s, 0) for s in sources)
+        for s in sources:
+            for d in self.dependencies.get(s, ()):
+                if d in pending:
+                    pending[d] += 1
+        layers = []
+        layer = [s for s in sources if not pending[s]]
+        while layer:
+            layers.append(layer)
+            nextlayer = []
+            for s in layer:
+                for d in self.dependencies.get(s, ()):
+                    if d in pending:
+                        pending[d] -= 1
+                        if not pending[d]:
+                            nextlayer.append(d)
+            layer = nextlayer
+        return layers
+
     def __enter__(self):
         return self
 
+    def __aenter__(self):
+        from .aio import aenter
+        return aenter(self)
+
+    def __aexit__(self, *exc_info):
+        from .aio import aexit
+        return aexit(self)
+
     def __exit__(self, *exc_info):
-        self.discardall()
+        try:
+            self.discardall()
+        finally:
+            if self.watchdog is not None:
+                self.watchdog.stop()
+
+    def adiscardall(self):
+        '''Like discardall but await any dispose coroutines, concurrently for objects in the same layer of reverse dependency order.'''
+        from .aio import adiscardall
+        return adiscardall(self)
 
     def discardall(self):
-        invokeall([s.discard for s in reversed(self.allsources)])
+        layers, self.startedlayers = self.startedlayers, []
+        self.dependencies.clear()
+        self.dependents.clear()
+        self.maketimes.clear()
+        invokeall([k.discardall for k in self.keyed.values()] + [partial(self._stoplayer, l) for l in reversed(layers)] + [self._discarder(s) for s in reversed(self._ownedsources())])
@@ -0,0 +1,78 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+
+class Graph:
+
+    def __init__(self, dependencies, maketimes):
+        self.sources = []
+        self.edges = []
+        indices = {}
+        def index(source):
+            try:
+                return indices[source]
+            except KeyError:
+                indices[source] = i = len(self.sources)
+                self.sources.append(source)
+                return i
+        for s, deps in dependencies.items():
+            i = index(s)
+            for d in deps:
+                self.edges.append((i, index(d)))
+        self.seconds = [maketimes.get(s, 0) for s in self.sources]
+        self.dependencies = [[] for _ in self.sources]
+        for i, j in self.edges:
+            self.dependencies[i].append(j)
+
+    def todot(self):
+        lines = ['digraph {']
+        for i, s in enumerate(self.sources):
+            lines.append('    %s [label="%s\\n%.6fs"];' % (i, s.typelabel.replace('"', '\\"'), self.seconds[i]))
+        for i, j in self.edges:
+            lines.append("    %s -> %s;" % (i, j))
+        lines.append('}')
+        return ''.join("%s\n" % l for l in lines)
+
+    def tojson(self):
+        return json.dumps(dict(
+            nodes = [dict(id = i, label = s.typelabel, seconds = self.seconds[i]) for i, s in enumerate(self.sources)],
+            edges = self.edges,
+        ), indent = 2, sort_keys = True)
+
+    def criticalpath(self):
+        '''Return the chain of (label, seconds) with the greatest total construction time, dependencies first.
+        Its total is the lower bound on startup time given perfect parallelism.'''
+        costs = {}
+        def cost(i):
+            try:
+                return costs[i]
+            except KeyError:
+                pass
+            best = max((cost(j) for j in self.dependencies[i]), key = lambda c: c[0]) if self.dependencies[i] else (0, ())
+            costs[i] = c = best[0] + self.seconds[i], best[1] + (i,)
+            return c
+        if not self.sources:
+            return []
+        _, path = max((cost(i) for i in range(len(self.sources))), key = lambda c: c[0])
+        return [(self.sources[i].typelabel, self.seconds[i]) for i in path]
+
+    def criticalpathreport(self):
+        path = self.criticalpath()
+        lines = ["%.6fs %s" % (seconds, label) for label, seconds in path]
+        lines.append("%.6fs total" % sum(seconds for _, seconds in path))
+        return ''.join("%s\n" % l for l in lines)
@@ -28,4 +28,8 @@ class UnsatisfiableRequestException(Exception): pass
 
 class ImpasseException(Exception): pass
 
+class DuplicateRegistrationException(Exception): pass
+
+class TimeoutException(Exception): pass
+
 unset = object()
@@ -0,0 +1,87 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+from .iface import Special, unset
+from .match import resolvetype
+from .util import invokeall
+from collections import namedtuple, OrderedDict
+from functools import partial
+import threading
+try:
+    from inspect import getfullargspec as getargspec
+except ImportError:
+    from inspect import getargspec
+
+CacheInfo = namedtuple('CacheInfo', 'hits misses evictions maxsize currsize')
+
+class Keyed:
+
+    def __init__(self, function, maxsize, di):
+        if maxsize < 1:
+            raise ValueError("Expected maxsize of at least 1 but got: %s" % maxsize) # Otherwise the new object would be disposed before it's returned.
+        self.type = resolvetype(function.di_owntype)
+        self.typelabel = Special.gettypelabel(self.type)
+        self.function = function
+        self.maxsize = maxsize
+        self.di = di
+        self.cache = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+        self.lock = threading.RLock() # So that concurrent misses for a key create one object, reentrant in case creation gets another.
+
+    def get(self, key):
+        evicted = unset
+        with self.lock:
+            try:
+                instance = self.cache.pop(key)
+            except KeyError:
+                instance = self._create(key)
+                self.misses += 1
+            else:
+                self.hits += 1
+            self.cache[key] = instance
+            if len(self.cache) > self.maxsize:
+                _, evicted = self.cache.popitem(False)
+                self.evictions += 1
+        if evicted is not unset:
+            self._dispose(evicted)
+        return instance
+
+    def _create(self, key):
+        deptypes = self.function.di_deptypes
+        defaults = (unset,) * len(deptypes) + tuple(getargspec(self.function).defaults or ())
+        args = [t.di_get(self.di, default) for t, default in zip(deptypes, defaults[len(defaults) - len(deptypes):])]
+        self.di._build(args)
+        self.di.log.debug("Fabricate: %s[%r]", self.typelabel, key)
+        return self.function(key, *(a.resolve() for a in args))
+
+    def _dispose(self, instance):
+        try:
+            dispose = instance.dispose
+        except AttributeError:
+            pass
+        else:
+            self.di.log.debug("Dispose: %s", self.typelabel)
+            dispose()
+
+    def cacheinfo(self):
+        return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self.cache))
+
+    def discardall(self):
+        with self.lock:
+            instances = list(self.cache.values())
+            self.cache.clear()
+        invokeall([partial(self._dispose, i) for i in reversed(instances)])
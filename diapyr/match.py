@@ -16,6 +16,32 @@
 # along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
 
 from .iface import UnsatisfiableRequestException, unset
+from importlib import import_module
+
+class Ref:
+
+    def __init__(self, name):
+        self.name = name
+        self.obj = unset
+
+    def resolve(self):
+        if self.obj is unset:
+            if ':' in self.name:
+                modulename, qualname = self.name.split(':')
+            else:
+                modulename, qualname = self.name.rsplit('.', 1)
+            obj = import_module(modulename)
+            for name in qualname.split('.'):
+                obj = getattr(obj, name)
+            self.obj = obj
+        return self.obj
+
+def resolvetype(obj):
+    if isinstance(obj, str):
+        return Ref(obj).resolve()
+    if isinstance(obj, Ref):
+        return obj.resolve()
+    return obj
 
 class DefaultArg:
 
@@ -47,15 +73,25 @@ class ListArg:
         self.trigger = trigger
 
     def resolve(self):
-        return [s.instance for s in self.sources]
+        instances = []
+        for s in self.sources:
+            if s.multiple:
+                instances.extend(s.instances)
+            else:
+                instances.append(s.instance)
+        return instances
 
 class BaseGetAll:
 
+    @property
+    def clazz(self):
+        return self.ref.resolve() if isinstance(self.ref, Ref) else self.ref
+
     def __init__(self, clazz):
-        self.clazz = clazz
+        self.ref = Ref(clazz) if isinstance(clazz, str) else clazz
 
     def getsources(self, di):
-        return [source for source in di.typetosources.get(self.clazz, []) if self.acceptsource(source)]
+        return [source for source in di.getsources(self.clazz) if self.acceptsource(source)]
 
 class GetAll(BaseGetAll):
 
@@ -70,15 +106,23 @@ class AllInstancesOf(GetAll):
 class One:
 
     def di_get(self, di, default):
+        origin = di
+        parentdepth = 0
         sources = self.getsources(di)
-        if not sources:
-            if di.parent is not None:
-                return self.di_get(di.parent, default) # XXX: Is parent thread-safe?
-            if default is not unset:
-                return DefaultArg(default)
-        if 1 != len(sources):
-            raise UnsatisfiableRequestException("Expected 1 object of type %s but got: %s" % (self.clazz, len(sources)))
-        return SourceArg(sources[0], self.clazz)
+        while not sources and di.parent is not None:
+            di = di.parent # XXX: Is parent thread-safe?
+            parentdepth += 1
+            sources = self.getsources(di)
+        origin.metrics.lookup(parentdepth)
+        if not sources and default is not unset:
+            return DefaultArg(default)
+        if 1 == len(sources) and not sources[0].multiple:
+            return SourceArg(sources[0], self.clazz)
+        count = sum(s.count for s in sources)
+        if 1 != count:
+            raise UnsatisfiableRequestException("Expected 1 object of type %s but got: %s" % (self.clazz, count))
+        source, = (s for s in sources if s.count)
+        return SourceArg(source.slot(0) if source.multiple else source, self.clazz)
 
 class OneInstanceOf(GetAll, One): pass
 
@@ -0,0 +1,26 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+def typename(type):
+    return "%s.%s" % (type.__module__, getattr(type, '__qualname__', type.__name__))
+
+def entrypoints(group):
+    from importlib.metadata import entry_points
+    try:
+        return entry_points(group = group)
+    except TypeError: # Python < 3.10.
+        return entry_points().get(group, [])
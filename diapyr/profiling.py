@@ -0,0 +1,83 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+import cProfile, os, pstats, threading
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+class Snapshot(object):
+    '''Loadable by pstats.Stats, which on Python 2 can't be created empty or from another Stats.'''
+
+    def __init__(self, stats):
+        self.stats = dict(stats.stats) # Merging replaces entries rather than mutating them.
+
+    def create_stats(self):
+        pass
+
+class Profiler:
+
+    def __init__(self):
+        self.stats = OrderedDict()
+        self.unprofiled = 0
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def make(self, source, plan):
+        if getattr(self.local, 'active', False): # Nested session, attribute to the outer source.
+            return plan.make()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError: # Another thread is profiling and this Python only allows one.
+            with self.lock:
+                self.unprofiled += 1
+            return plan.make()
+        self.local.active = True
+        try:
+            plan.make()
+        finally:
+            profile.disable()
+            self.local.active = False
+            self._add(source.typelabel, pstats.Stats(profile))
+
+    def _add(self, label, stats):
+        with self.lock:
+            try:
+                self.stats[label].add(stats)
+            except KeyError:
+                self.stats[label] = stats
+
+    def ranked(self):
+        with self.lock:
+            return sorted(self.stats.items(), key = lambda item: -item[1].total_tt)
+
+    def report(self, limit = 20):
+        stream = StringIO()
+        ranked = self.ranked()
+        for label, stats in ranked:
+            stream.write("%.6fs %s\n" % (stats.total_tt, label))
+        if ranked:
+            combined = pstats.Stats(Snapshot(ranked[0][1]), *[stats for _, stats in ranked[1:]], stream = stream)
+            combined.sort_stats('tottime').print_stats(limit)
+        return stream.getvalue()
+
+    def dump(self, dirpath):
+        for label, stats in self.ranked():
+            stats.dump_stats(os.path.join(dirpath, "%s.pstats" % label))
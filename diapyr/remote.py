@@ -0,0 +1,81 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from inspect import getfullargspec
+
+_instance = None # Of the worker process.
+
+def _construct(cls, args, enhancers):
+    global _instance
+    _instance = cls(*args)
+    for name, eargs in enhancers:
+        getattr(_instance, name)(*eargs)
+    return [name for name in dir(_instance) if not name.startswith('_') and callable(getattr(_instance, name))]
+
+def _call(name, args, kwargs):
+    return getattr(_instance, name)(*args, **kwargs)
+
+def _dispose():
+    global _instance
+    instance, _instance = _instance, None
+    try:
+        dispose = instance.dispose
+    except AttributeError:
+        pass
+    else:
+        dispose()
+
+def spawn(cls, args, enhancers):
+    pool = ProcessPoolExecutor(1)
+    try:
+        methods = pool.submit(_construct, cls, args, enhancers).result()
+    except:
+        pool.shutdown()
+        raise
+    return RemoteProxy(pool, methods)
+
+def builder(name, method):
+    '''Make a builder method that runs in the worker via the proxy, so its result must be picklable.'''
+    def build(proxy, *args):
+        return proxy._call(name, *args) # By dir name, which may be mangled.
+    build.di_deptypes = method.di_deptypes
+    build.di_owntype = method.di_owntype
+    build.di_defaults = getfullargspec(method).defaults
+    build.__name__ = name
+    return build
+
+class RemoteProxy(object):
+
+    def __init__(self, pool, methods):
+        self._pool = pool
+        self._methods = frozenset(methods)
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in self._methods:
+            raise AttributeError(name)
+        return partial(self._call, name)
+
+    def _call(self, name, *args, **kwargs):
+        return self._pool.submit(_call, name, args, kwargs).result()
+
+    def dispose(self):
+        try:
+            self._pool.submit(_dispose).result()
+        finally:
+            self._pool.shutdown()
@@ -0,0 +1,86 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+from .iface import UnsatisfiableRequestException
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+import asyncio
+
+class Scope:
+    '''Ambient child container of the app container, one per asyncio task or open block.'''
+
+    def __init__(self, di, configure = None):
+        self.template = di.__class__(di)
+        if configure is not None:
+            configure(self.template)
+        self.var = ContextVar('diapyr.scope', default = (None, None))
+        self.discarding = set() # The loop only keeps weak references to tasks.
+
+    def current(self):
+        owner, child = self.var.get()
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if child is not None and (owner is task or owner is self): # Tasks inherit the context of their creator, so check ownership.
+            return child
+        if task is None:
+            raise UnsatisfiableRequestException('No current task or open scope.')
+        child = self._new()
+        self.var.set((task, child))
+        task.add_done_callback(lambda t: self._discardlater(t.get_loop(), child))
+        return child
+
+    def _discardlater(self, loop, child):
+        task = loop.create_task(self._adiscard(child))
+        self.discarding.add(task)
+        task.add_done_callback(self.discarding.discard)
+
+    async def _adiscard(self, child):
+        try:
+            await child.adiscardall()
+        except Exception:
+            child.log.exception('Failed to discard task scope:')
+
+    def _new(self):
+        return self.template.clone() # Much cheaper than adding everything again.
+
+    @contextmanager
+    def open(self):
+        child = self._new()
+        token = self.var.set((self, child))
+        try:
+            yield child
+        finally:
+            self.var.reset(token)
+            child.discardall()
+
+    @asynccontextmanager
+    async def aopen(self):
+        child = self._new()
+        token = self.var.set((self, child))
+        try:
+            yield child
+        finally:
+            self.var.reset(token)
+            await child.adiscardall()
+
+    def add(self, obj):
+        self.current().add(obj)
+
+    def __call__(self, *args, **kwargs):
+        return self.current()(*args, **kwargs)
@@ -0,0 +1,111 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+from .diapyr import DI, types
+from .iface import UnsatisfiableRequestException
+from unittest import TestCase
+import asyncio
+
+class App:
+
+    @types()
+    def __init__(self): pass
+
+class Request:
+
+    disposed = 0
+
+    @types(App)
+    def __init__(self, app):
+        self.app = app
+
+    def dispose(self):
+        Request.disposed += 1
+
+class Conn:
+
+    closed = 0
+
+    @types()
+    def __init__(self): pass
+
+    async def dispose(self):
+        await asyncio.sleep(0)
+        Conn.closed += 1
+
+def configure(child):
+    child.add(Request)
+    child.add(Conn)
+
+class TestScope(TestCase):
+
+    def setUp(self):
+        Request.disposed = Conn.closed = 0
+
+    def test_tasks(self):
+        di = DI()
+        di.add(App)
+        scope = di.scope(configure)
+        async def handle():
+            r = scope(Request)
+            scope(Conn)
+            await asyncio.sleep(0)
+            self.assertIs(r, scope(Request))
+            return r
+        async def main():
+            first = scope(Request)
+            requests = await asyncio.gather(*[handle() for _ in range(1000)])
+            self.assertIs(first, scope(Request))
+            for _ in range(3):
+                await asyncio.sleep(0) # Let the discards of the handler scopes run.
+            self.assertEqual(1000, Request.disposed)
+            self.assertEqual(1000, Conn.closed)
+            return first, requests
+        first, requests = asyncio.run(main())
+        self.assertEqual(1001, len(set(map(id, requests + [first]))))
+        self.assertEqual(set([di(App)]), set(r.app for r in requests))
+
+    def test_open(self):
+        di = DI()
+        di.add(App)
+        scope = di.scope(lambda child: child.add(Request))
+        with self.assertRaises(UnsatisfiableRequestException):
+            scope(Request)
+        with scope.open() as child:
+            r = scope(Request)
+            self.assertIs(r, child(Request))
+            with scope.open():
+                self.assertIsNot(r, scope(Request))
+                self.assertEqual(0, Request.disposed)
+            self.assertEqual(1, Request.disposed)
+            self.assertIs(r, scope(Request))
+        self.assertEqual(2, Request.disposed)
+
+    def test_aopen(self):
+        di = DI()
+        di.add(App)
+        scope = di.scope(configure)
+        async def main():
+            async with scope.aopen() as child:
+                self.assertIs(child(Conn), scope(Conn))
+                self.assertIs(child(Conn), await asyncio.create_task(self._conn(scope))) # Shared with tasks started within.
+                self.assertEqual(0, Conn.closed)
+            self.assertEqual(1, Conn.closed)
+        asyncio.run(main())
+
+    async def _conn(self, scope):
+        return scope(Conn)
@@ -16,39 +16,173 @@
 # along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
 
 from .iface import Special, unset
-from .match import ExactMatch, wrap
-from .util import innerclass
+from .match import ExactMatch, resolvetype, wrap
+from .util import innerclass, monotonic
 try:
     from inspect import getfullargspec as getargspec
 except ImportError:
     from inspect import getargspec
 from itertools import chain, repeat
+from weakref import WeakKeyDictionary
+
+def typeclosure(type):
+    def addtype(type):
+        types.add(type)
+        for base in type.__bases__:
+            if base not in types:
+                addtype(base)
+    types = set()
+    addtype(type)
+    return types
+
+def _defaults(function):
+    try:
+        return function.di_defaults
+    except AttributeError:
+        defaults = getargspec(function).defaults
+        getattr(function, '__func__', function).di_defaults = defaults
+        return defaults
+
+_enhancercache = WeakKeyDictionary()
+
+def _enhancers(cls):
+    try:
+        return _enhancercache[cls]
+    except KeyError:
+        pass
+    methods = {}
+    for name in dir(cls):
+        if '__init__' != name:
+            m = getattr(cls, name)
+            if hasattr(m, 'di_deptypes') and not hasattr(m, 'di_owntype'):
+                methods[name] = m
+    enhancers = []
+    if methods:
+        for ancestor in reversed(cls.mro()):
+            for name in dir(ancestor):
+                try:
+                    enhancers.append([name, methods.pop(name)])
+                except KeyError:
+                    pass
+    _enhancercache[cls] = enhancers
+    return enhancers
+
+def _caller(function, args):
+    '''Compile a call of function with the given args resolved, avoiding per-call iteration for small arities.'''
+    resolvers = [a.resolve for a in args]
+    n = len(resolvers)
+    if not n:
+        return function
+    if 1 == n:
+        r, = resolvers
+        return lambda: function(r())
+    if 2 == n:
+        r, s = resolvers
+        return lambda: function(r(), s())
+    if 3 == n:
+        r, s, t = resolvers
+        return lambda: function(r(), s(), t())
+    return lambda: function(*[r() for r in resolvers])
+
+def _enhancer(method, args):
+    resolvers = [a.resolve for a in args]
+    return lambda instance: method(instance, *[r() for r in resolvers])
 
 class Source(object):
 
-    def __init__(self, type):
-        def addtype(type):
-            self.types.add(type)
-            for base in type.__bases__:
-                if base not in self.types:
-                    addtype(base)
-        self.types = set()
-        addtype(type)
+    multiple = False
+    count = 1
+
+    def __init__(self, type, closures = None):
+        if closures is None:
+            self.types = typeclosure(type)
+        else:
+            try:
+                self.types = closures[type]
+            except KeyError:
+                self.types = closures[type] = typeclosure(type)
         self.typelabel = Special.gettypelabel(type)
         self.type = type
 
+    def _closures(self):
+        return {self.type: self.types}
+
 class Instance(Source):
 
-    def __init__(self, instance, type):
-        super(Instance, self).__init__(type)
+    def __init__(self, instance, type, closures = None):
+        super(Instance, self).__init__(type, closures)
         self.instance = instance
 
+    def clone(self, di, reuse):
+        return Instance(self.instance, self.type, self._closures())
+
     def plan(self, depth, trigger):
         pass
 
+    def setinstance(self, instance):
+        self.instance = instance
+
     def discard(self):
         pass # TODO: Test this if possible.
 
+class Bucket(Source):
+    '''Compact storage of many instances of one class, sharing a single type closure.'''
+
+    multiple = True
+
+    @property
+    def count(self):
+        return len(self.instances)
+
+    def __init__(self, type, closures = None):
+        super(Bucket, self).__init__(type, closures)
+        self.instances = []
+        self.slots = {}
+
+    def clone(self, di, reuse):
+        bucket = Bucket(self.type, self._closures())
+        bucket.instances.extend(self.instances)
+        return bucket
+
+    def plan(self, depth, trigger):
+        pass
+
+    def discard(self):
+        pass
+
+    def slot(self, index):
+        try:
+            return self.slots[index]
+        except KeyError:
+            self.slots[index] = slot = Slot(self, index)
+            return slot
+
+class Slot(object):
+    '''Source for one instance of a bucket, materialised on demand.'''
+
+    multiple = False
+    count = 1
+
+    @property
+    def instance(self):
+        return self.bucket.instances[self.index]
+
+    def __init__(self, bucket, index):
+        self.types = bucket.types
+        self.typelabel = bucket.typelabel
+        self.type = bucket.type
+        self.bucket = bucket
+        self.index = index
+
+    def plan(self, depth, trigger):
+        pass
+
+    def setinstance(self, instance):
+        self.bucket.instances[self.index] = instance
+
+    def discard(self):
+        pass
+
 class Proxy(Source):
 
     @property
@@ -59,10 +193,17 @@ class Proxy(Source):
         super(Proxy, self).__init__(type)
         self.otherdi = otherdi
         self.discardall = discardall
+        self.boundversion = None
+
+    def clone(self, di, reuse):
+        return Proxy(self.otherdi, self.type, False) # The other container isn't the clone's to discard.
 
     def _othersource(self):
-        s, = ExactMatch(self.type).getsources(self.otherdi)
-        return s
+        if self.boundversion != self.otherdi.version:
+            s, = ExactMatch(self.type).getsources(self.otherdi)
+            self.boundsource = s
+            self.boundversion = self.otherdi.version # After any deferred registration by getsources.
+        return self.boundsource
 
     def plan(self, depth, trigger):
         return self._othersource().plan(depth, trigger)
@@ -74,12 +215,20 @@ class Proxy(Source):
 class Creator(Source):
 
     instance = unset
+    shared = False
 
-    def __init__(self, instantiator, di):
-        super(Creator, self).__init__(instantiator.resulttype)
+    def __init__(self, instantiator, di, closures = None):
+        super(Creator, self).__init__(instantiator.resulttype, closures)
         self.instantiator = instantiator
         self.di = di
 
+    def clone(self, di, reuse):
+        creator = self._new(di)
+        if self.instance is not unset and isinstance(self.instance, reuse):
+            creator.instance = self.instance
+            creator.shared = True
+        return creator
+
     def plan(self, depth, trigger):
         if self.instance is unset:
             self.di.log.debug("%s Request: %s%s", depth, self.typelabel, '' if trigger == self.type else "(%s)" % Special.gettypelabel(trigger))
@@ -95,14 +244,20 @@ class Creator(Source):
 
     def discard(self):
         instance, self.instance = self.instance, unset
-        if instance is not unset:
+        if self.shared: # Not ours to dispose.
+            self.shared = False
+        elif instance is not unset:
             try:
                 dispose = instance.dispose
             except AttributeError:
                 pass
             else:
                 self.di.log.debug("Dispose: %s", self.typelabel)
-                dispose()
+                start = monotonic()
+                try:
+                    return dispose() # Possibly a coroutine, for adiscardall.
+                finally:
+                    self.di.metrics.disposed(self, monotonic() - start)
 
 class CreatorPlan(object):
 
@@ -132,41 +287,50 @@ class Class(Creator):
             def args(self):
                 for a in self.ctorargs:
                     yield a
-                for _, eargs in self.enhancers:
+                for _, _, eargs in self.enhancers:
                     for a in eargs:
                         yield a
 
             def __init__(self, depth):
                 CreatorPlan.__init__(self, depth)
-                ctor = self.cls.__init__
-                methods = {}
-                for name in dir(self.cls):
-                    if '__init__' != name:
-                        m = getattr(self.cls, name)
-                        if hasattr(m, 'di_deptypes') and not hasattr(m, 'di_owntype'):
-                            methods[name] = m
-                self.ctorargs = self.toargs(ctor.di_deptypes, getargspec(ctor).defaults)
-                self.enhancers = []
-                if methods:
-                    for ancestor in reversed(self.cls.mro()):
-                        for name in dir(ancestor):
-                            try:
-                                m = methods.pop(name)
-                            except KeyError:
-                                pass
-                            else:
-                                self.enhancers.append([m, self.toargs(m.di_deptypes, getargspec(m).defaults)])
-
-            def fire(self):
-                instance = self.cls(*(a.resolve() for a in self.ctorargs))
-                if self.enhancers:
-                    self.di.log.debug("%s Enhance: %s", self.depth, self.typelabel)
-                    for m, eargs in self.enhancers:
-                        m(instance, *(a.resolve() for a in eargs))
-                return instance
-
-    def __init__(self, cls, di):
-        super(Class, self).__init__(self.Instantiate(cls), di)
+                cls = self.cls
+                ctor = cls.__init__
+                self.ctorargs = self.toargs(ctor.di_deptypes, _defaults(ctor))
+                self.enhancers = [[name, m, self.toargs(m.di_deptypes, _defaults(m))] for name, m in _enhancers(cls)]
+                self.fire = self._compile(depth, self.ctorargs, self.enhancers)
+
+    def __init__(self, cls, di, closures = None):
+        super(Class, self).__init__(self.Instantiate(cls), di, closures)
+
+    def _new(self, di):
+        return Class(self.instantiator.cls, di, self._closures())
+
+    def _compile(self, depth, ctorargs, enhancers):
+        construct = _caller(self.instantiator.cls, ctorargs)
+        if not enhancers:
+            return construct
+        enhancers = [_enhancer(m, eargs) for _, m, eargs in enhancers]
+        log, typelabel = self.di.log, self.typelabel
+        def fire():
+            instance = construct()
+            log.debug("%s Enhance: %s", depth, typelabel)
+            for e in enhancers:
+                e(instance)
+            return instance
+        return fire
+
+class Remote(Class):
+    '''Builds its class in a worker process of its own, the instance is a proxy that forwards public method calls.'''
+
+    def _new(self, di):
+        return Remote(self.instantiator.cls, di, self._closures())
+
+    def _compile(self, depth, ctorargs, enhancers):
+        from .remote import spawn
+        cls = self.instantiator.cls
+        def fire():
+            return spawn(cls, [a.resolve() for a in ctorargs], [[name, [a.resolve() for a in eargs]] for name, _, eargs in enhancers]) # The dir name, which is mangled if need be.
+        return fire
 
 class Factory(Creator):
 
@@ -175,7 +339,7 @@ class Factory(Creator):
 
         @property
         def resulttype(self):
-            return self.function.di_owntype
+            return resolvetype(self.function.di_owntype)
 
         def __init__(self, function):
             self.function = function
@@ -185,13 +349,15 @@ class Factory(Creator):
 
             def __init__(self, depth):
                 CreatorPlan.__init__(self, depth)
-                self.args = self.toargs(self.function.di_deptypes, getargspec(self.function).defaults)
+                function = self.function
+                self.args = self.toargs(function.di_deptypes, _defaults(function))
+                self.fire = _caller(function, self.args)
 
-            def fire(self):
-                return self.function(*(a.resolve() for a in self.args))
+    def __init__(self, function, di, closures = None):
+        super(Factory, self).__init__(self.Fabricate(function), di, closures)
 
-    def __init__(self, function, di):
-        super(Factory, self).__init__(self.Fabricate(function), di)
+    def _new(self, di):
+        return Factory(self.instantiator.function, di, self._closures())
 
 class Builder(Creator):
 
@@ -200,9 +366,10 @@ class Builder(Creator):
 
         @property
         def resulttype(self):
-            return self.method.di_owntype
+            return resolvetype(self.method.di_owntype)
 
         def __init__(self, receivertype, method):
+            self.receivertype = receivertype
             self.receivermatch = wrap(receivertype)
             self.method = method
 
@@ -211,10 +378,12 @@ class Builder(Creator):
 
             def __init__(self, depth):
                 CreatorPlan.__init__(self, depth)
-                self.args = self.toargs((self.receivermatch,) + self.method.di_deptypes, getargspec(self.method).defaults)
+                method = self.method
+                self.args = self.toargs((self.receivermatch,) + method.di_deptypes, _defaults(method))
+                self.fire = _caller(method, self.args)
 
-            def fire(self):
-                return self.method(*(a.resolve() for a in self.args))
+    def __init__(self, receivertype, method, di, closures = None):
+        super(Builder, self).__init__(self.Build(receivertype, method), di, closures)
 
-    def __init__(self, receivertype, method, di):
-        super(Builder, self).__init__(self.Build(receivertype, method), di)
+    def _new(self, di):
+        return Builder(self.instantiator.receivertype, self.instantiator.method, di, self._closures())
@@ -18,7 +18,9 @@
 from .iface import Special
 from .match import ExactMatch
 
-class Started(Special): pass
+class Started(Special):
+
+    starttimeout = stoptimeout = None
 
 def starter(startabletype):
     try:
@@ -35,6 +37,9 @@ def starter(startabletype):
         startable.start()
         self.startable = startable
     def dispose(self):
-        self.startable.stop() # FIXME: Untested.
-    startabletype.di_starter = startedtype = type("Started[%s]" % Special.gettypelabel(startabletype), (Started,), {f.__name__: f for f in [__init__, dispose]})
+        self.startable.stop()
+    attrs = {f.__name__: f for f in [__init__, dispose]}
+    for name in 'starttimeout', 'stoptimeout':
+        attrs[name] = getattr(startabletype, name, None)
+    startabletype.di_starter = startedtype = type("Started[%s]" % Special.gettypelabel(startabletype), (Started,), attrs)
     return startedtype
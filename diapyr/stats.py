@@ -0,0 +1,137 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+import os
+
+class SourceStats(object):
+
+    __slots__ = 'hits', 'constructions', 'makeseconds', 'disposals', 'disposeseconds'
+
+    def __init__(self):
+        self.hits = self.constructions = self.disposals = 0
+        self.makeseconds = self.disposeseconds = 0.
+
+class Stats:
+
+    def __init__(self):
+        self.resolutions = self.plans = self.hits = self.constructions = self.disposals = 0
+        self.planseconds = self.makeseconds = self.disposeseconds = 0.
+        self.lookups = self.parenthops = self.maxparentdepth = 0
+        self.sources = {} # By label, so that removed sources aren't kept alive.
+
+    def _source(self, source):
+        try:
+            return self.sources[source.typelabel]
+        except KeyError:
+            self.sources[source.typelabel] = s = SourceStats()
+            return s
+
+    def planned(self, source, plan):
+        if plan:
+            self.plans += 1
+        else:
+            self.hits += 1
+            self._source(source).hits += 1
+
+    def made(self, source, seconds):
+        self.constructions += 1
+        self.makeseconds += seconds
+        s = self._source(source)
+        s.constructions += 1
+        s.makeseconds += seconds
+
+    def disposed(self, source, seconds):
+        self.disposals += 1
+        self.disposeseconds += seconds
+        s = self._source(source)
+        s.disposals += 1
+        s.disposeseconds += seconds
+
+    def lookup(self, parentdepth):
+        self.lookups += 1
+        if parentdepth:
+            self.parenthops += parentdepth
+            if parentdepth > self.maxparentdepth:
+                self.maxparentdepth = parentdepth
+
+    def snapshot(self, live):
+        sources = OrderedDict()
+        for label, s in sorted(self.sources.items()): # Sources with the same label are combined.
+            sources[label] = OrderedDict((name, getattr(s, name)) for name in SourceStats.__slots__)
+        return OrderedDict([
+            ['resolutions', self.resolutions],
+            ['plans', self.plans],
+            ['hits', self.hits],
+            ['constructions', self.constructions],
+            ['disposals', self.disposals],
+            ['live', live],
+            ['planseconds', self.planseconds],
+            ['makeseconds', self.makeseconds],
+            ['disposeseconds', self.disposeseconds],
+            ['lookups', self.lookups],
+            ['parenthops', self.parenthops],
+            ['maxparentdepth', self.maxparentdepth],
+            ['sources', sources],
+        ])
+
+_help = dict(
+    resolutions = ['counter', 'Matches resolved by sessions.'],
+    plans = ['counter', 'Plans built to create objects.'],
+    hits = ['counter', 'Planned sources that already had an object.'],
+    constructions = ['counter', 'Objects created.'],
+    disposals = ['counter', 'Objects disposed.'],
+    live = ['gauge', 'Created objects not yet discarded.'],
+    planseconds = ['counter', 'Time spent planning.'],
+    makeseconds = ['counter', 'Time spent creating objects.'],
+    disposeseconds = ['counter', 'Time spent disposing objects.'],
+    lookups = ['counter', 'Single-object lookups.'],
+    parenthops = ['counter', 'Parent containers walked by lookups.'],
+    maxparentdepth = ['gauge', 'Deepest parent container walked by a lookup.'],
+)
+
+def _name(prefix, name, kind):
+    return "%s_%s%s" % (prefix, name, '_total' if 'counter' == kind else '')
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def prometheus(snapshot, prefix = 'diapyr'):
+    lines = []
+    for name, value in snapshot.items():
+        if 'sources' == name:
+            continue
+        kind, text = _help[name]
+        metric = _name(prefix, name, kind)
+        lines.append("# HELP %s %s" % (metric, text))
+        lines.append("# TYPE %s %s" % (metric, kind))
+        lines.append("%s %r" % (metric, value))
+    for name in SourceStats.__slots__:
+        kind, text = _help[name]
+        metric = _name("%s_source" % prefix, name, kind)
+        lines.append("# HELP %s %s" % (metric, text))
+        lines.append("# TYPE %s %s" % (metric, kind))
+        for label, d in snapshot['sources'].items():
+            lines.append('%s{source="%s"} %r' % (metric, _escape(label), d[name]))
+    return ''.join("%s\n" % l for l in lines)
+
+def writeprometheus(snapshot, path, prefix = 'diapyr'):
+    '''Write atomically, as required by a textfile collector.'''
+    temppath = "%s.%s.tmp" % (path, os.getpid())
+    with open(temppath, 'w') as f:
+        f.write(prometheus(snapshot, prefix))
+    os.rename(temppath, path)
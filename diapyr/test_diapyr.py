@@ -17,11 +17,13 @@
 
 from __future__ import division
 from .diapyr import DI, types
-from .iface import ImpasseException, MissingAnnotationException, UnsatisfiableRequestException
+from .iface import DuplicateRegistrationException, ImpasseException, MissingAnnotationException, UnsatisfiableRequestException
+from .match import Ref
 from .start import Started
 from .util import ispy2
+from tempfile import mkdtemp
 from unittest import TestCase
-import sys
+import os, shutil, sys
 
 def _add(di, obj):
     methods = list(di._addmethods(obj))
@@ -300,6 +302,255 @@ class TestDI(DebugCase):
             ('%s %s: %s', '>', 'Instantiate', 'diapyr.test_diapyr.D'),
         ], self.debugs)
 
+    def test_resolveall(self):
+        self.debugs = []
+        class A:
+            @types()
+            def __init__(self): pass
+        class B:
+            @types(A)
+            def __init__(self, a): self.a = a
+        class C:
+            @types(A)
+            def __init__(self, a): self.a = a
+        di = DI()
+        di.log = self
+        di.add(A)
+        di.add(B)
+        di.add(C)
+        b, cs, c = di.resolveall([B, [C], C])
+        self.assertIs(b.a, c.a)
+        self.assertEqual([c], cs)
+        self.assertEqual([
+            ('%s Request: %s%s', '>', 'diapyr.test_diapyr.B', ''),
+            ('%s Request: %s%s', '>', 'diapyr.test_diapyr.C', ''),
+            ('%s Request: %s%s', '>>', 'diapyr.test_diapyr.A', ''),
+            ('%s %s: %s', '>>', 'Instantiate', 'diapyr.test_diapyr.A'),
+            ('%s %s: %s', '>', 'Instantiate', 'diapyr.test_diapyr.B'),
+            ('%s %s: %s', '>', 'Instantiate', 'diapyr.test_diapyr.C'),
+        ], self.debugs)
+        self.assertEqual([], di.resolveall([]))
+
+    def test_addall(self):
+        class Config:
+            def __init__(self, n): self.n = n
+        class T:
+            @types(this = str)
+            def text(self): return 't'
+        class A:
+            @types([Config])
+            def __init__(self, configs): self.ns = [c.n for c in configs]
+            def start(self): pass
+        @types(A, this = int)
+        def f(a): return sum(a.ns)
+        di = DI()
+        di.add(Config(1))
+        di.addall([Config(2), A, T(), f])
+        self.assertEqual([1, 2], di(A).ns)
+        self.assertEqual(3, di(int))
+        self.assertEqual('t', di(str))
+        self.assertEqual([A], [s.startable.__class__ for s in di.all(Started)])
+        config = Config(3)
+        with self.assertRaises(DuplicateRegistrationException):
+            di.addall([config, A], True)
+        with self.assertRaises(DuplicateRegistrationException):
+            di.addall([config, config], True)
+        with self.assertRaises(MissingAnnotationException):
+            di.addall([Config(4), Config])
+        self.assertEqual(2, len(di.all(Config))) # Nothing added by failed batches.
+        di.addall([config, config])
+        self.assertEqual(4, len(di.all(Config)))
+
+    def test_compact(self):
+        class Entity:
+            def __init__(self, n): self.n = n
+        class Special(Entity): pass
+        class Other(Entity):
+            @types(this = str)
+            def label(self): return 'other'
+        class User:
+            @types(Special)
+            def __init__(self, special): self.special = special
+        di = DI(compact = True)
+        di.addall(Entity(n) for n in range(3))
+        special = Special(3)
+        di.add(special)
+        di.add(Other(4))
+        di.add(Entity(5))
+        di.add(User)
+        self.assertEqual([0, 1, 2, 5, 3, 4], [e.n for e in di.all(Entity)]) # Grouped by class.
+        self.assertEqual(['Bucket', 'Bucket', 'Instance', 'Builder', 'Class'], [type(s).__name__ for s in di.allsources]) # Other has a builder so isn't bucketed.
+        self.assertIs(special, di(User).special)
+        with self.assertRaises(UnsatisfiableRequestException) as cm:
+            di(Entity)
+        self.assertEqual(("Expected 1 object of type %s but got: 6" % Entity,), cm.exception.args)
+        self.assertEqual('other', di(str))
+        newspecial = Special(6)
+        di.replace(special, newspecial)
+        self.assertIs(newspecial, di(User).special)
+        self.assertIs(newspecial, di(Special))
+        with self.assertRaises(DuplicateRegistrationException):
+            di.addall([newspecial], True)
+        class Bad: pass
+        class Fresh: pass
+        with self.assertRaises(MissingAnnotationException):
+            di.addall([Entity(7), Fresh(), Bad])
+        self.assertEqual([0, 1, 2, 5], [e.n for e in di.all(Entity) if e.__class__ is Entity]) # Nothing added on failure.
+        self.assertEqual([], di.all(Fresh))
+        di.add(Fresh())
+        self.assertEqual(1, len(di.all(Fresh)))
+
+    def test_joinall(self):
+        class A:
+            @types()
+            def __init__(self): pass
+        class B:
+            @types()
+            def __init__(self): pass
+        di = DI()
+        subdi = DI(di)
+        subdi.joinall([A, B])
+        with self.assertRaises(ValueError):
+            di(A)
+        subdi.add(A)
+        subdi.add(B)
+        a = di(A)
+        self.assertIs(a, subdi(A))
+        self.assertIs(subdi(B), di(B))
+        proxy = di.allsources[0]
+        bound = proxy.boundsource
+        di(A)
+        self.assertIs(bound, proxy.boundsource)
+        version = subdi.version
+        subdi.add('woo')
+        self.assertEqual(version + 1, subdi.version)
+        self.assertIs(a, di(A)) # Rebound.
+        self.assertIs(bound, proxy.boundsource)
+
+    def test_iterall(self):
+        events = []
+        class Handler: pass
+        class Dep:
+            @types()
+            def __init__(self): events.append('Dep')
+        class Slow(Handler):
+            @types(Dep)
+            def __init__(self, dep): events.append('Slow')
+        class Fast(Handler):
+            @types()
+            def __init__(self): events.append('Fast')
+        class Shared(Handler):
+            @types(Dep)
+            def __init__(self, dep): events.append('Shared')
+        di = DI()
+        di.add(Dep)
+        di.add(Slow)
+        di.add(Fast)
+        di.add(Shared)
+        handlers = di.iterall(Handler)
+        self.assertEqual([], events)
+        self.assertIs(Fast, next(handlers).__class__)
+        self.assertEqual(['Fast'], events)
+        self.assertIs(Slow, next(handlers).__class__)
+        self.assertEqual(['Fast', 'Dep', 'Slow'], events)
+        self.assertEqual([Shared], [h.__class__ for h in handlers])
+        self.assertEqual(['Fast', 'Dep', 'Slow', 'Shared'], events)
+        self.assertEqual(di.all(Handler), list(di.iterall(Handler, True)))
+        self.assertEqual(['Fast', 'Dep', 'Slow', 'Shared'], events)
+        Dep.dispose = lambda self: events.append('dispose')
+        Slow.__init__ = types(Dep)(lambda self, dep: setattr(self, 'dep', dep))
+        di = DI()
+        di.add(Dep)
+        di.add(Slow)
+        di.add(Fast)
+        handlers = di.iterall(Handler)
+        self.assertIs(Fast, next(handlers).__class__)
+        dep = di(Dep) # Consumer resolves a planned dependency between yields.
+        self.assertIs(dep, next(handlers).dep)
+        self.assertEqual(['Fast', 'Dep', 'Slow', 'Shared', 'Fast', 'Dep'], events)
+        di.discardall()
+        self.assertEqual(['Fast', 'Dep', 'Slow', 'Shared', 'Fast', 'Dep', 'dispose'], events)
+
+    def test_snapshot(self):
+        from threading import Thread
+        di = DI()
+        di.add(1)
+        sources = di.getsources(int)
+        self.assertIs(sources, di.getsources(int))
+        di.add(2)
+        self.assertEqual([1], [s.instance for s in sources])
+        self.assertEqual([1, 2], di.all(int))
+        errors = []
+        def read():
+            try:
+                for _ in range(1000):
+                    self.assertIn(len(di.getsources(int)), [2, 3]) # Never a torn index.
+            except Exception as e:
+                errors.append(e)
+        readers = [Thread(target = read) for _ in range(4)]
+        for t in readers:
+            t.start()
+        for i in range(500):
+            di.add(i + 3)
+            di.removesource(di.getsources(int)[0])
+        for t in readers:
+            t.join()
+        self.assertEqual([], errors)
+        self.assertEqual(2, len(di.all(int)))
+
+    def test_clone(self):
+        disposed = []
+        class D:
+            def dispose(self): disposed.append(self.__class__.__name__)
+        class Config(D):
+            @types()
+            def __init__(self): pass
+        class Client(D):
+            @types()
+            def __init__(self): pass
+        class Service(D):
+            @types(Config, Client)
+            def __init__(self, config, client): self.client = client
+        class FakeClient(Client):
+            def __init__(self): pass
+        template = DI()
+        for cls in Config, Client, Service:
+            template.add(cls)
+        config, service = template(Config), template(Service)
+        di = template.clone([Config])
+        self.assertIs(template.typetosources, di.typetosources)
+        fake = FakeClient()
+        di.override(Client, fake)
+        self.assertIsNot(template.typetosources, di.typetosources)
+        s = di(Service)
+        self.assertIsNot(service, s)
+        self.assertIs(fake, s.client)
+        self.assertIs(config, di(Config))
+        self.assertIs(service, template(Service))
+        self.assertIs(Client, template(Client).__class__)
+        template.add('extra')
+        self.assertEqual([], di.all(str))
+        self.assertIs(fake, di.clone([Client])(Service).client)
+        di.discardall()
+        self.assertEqual(['Service'], disposed) # Not the shared config, nor the fake that was never created by di.
+        other = template.clone()
+        self.assertIsNot(config, other(Config))
+        other.discardall()
+        template.discardall()
+        self.assertEqual(['Service', 'Config', 'Service', 'Client', 'Config'], disposed)
+        class E:
+            def __init__(self, n): self.n = n
+        compact = DI(compact = True)
+        compact.add(E(1))
+        compact.override(E, E(2))
+        compact.add(E(3))
+        self.assertEqual([2, 3], [e.n for e in compact.all(E)])
+        di = compact.clone()
+        di.override(E, E(4))
+        di.add(E(5))
+        self.assertEqual([4, 5], [e.n for e in di.all(E)])
+        self.assertEqual([2, 3], [e.n for e in compact.all(E)])
+
     def test_child(self):
         class A:
             @types()
@@ -529,6 +780,136 @@ self.assertEqual(['woo', log], di(int))''')
         with self.assertRaises(ImpasseException):
             di(B)
 
+    def test_replace(self):
+        disposed = []
+        class Config:
+            def __init__(self, name): self.name = name
+        class D:
+            def dispose(self): disposed.append(self.__class__.__name__)
+        class A(D):
+            @types(Config)
+            def __init__(self, config): self.name = config.name
+        class B(D):
+            @types(A)
+            def __init__(self, a): self.name = a.name
+        class C(D):
+            @types()
+            def __init__(self): pass
+        class E(D):
+            @types(B, C)
+            def __init__(self, b, c): self.name = b.name
+        config = Config('old')
+        di = DI()
+        di.add(config)
+        for cls in A, B, C, E:
+            di.add(cls)
+        a, c, e = di(A), di(C), di(E)
+        self.assertEqual('old', e.name)
+        di.replace(config, Config('new'))
+        self.assertEqual(['E', 'B', 'A'], disposed)
+        self.assertIsNot(a, di(A))
+        self.assertIs(c, di(C))
+        self.assertIsNot(e, di(E))
+        self.assertEqual('new', di(E).name)
+        newa = di(A)
+        di.replace(newa, A(Config('newer')))
+        self.assertEqual(['E', 'B', 'A', 'E', 'B'], disposed)
+        self.assertEqual('newer', di(E).name)
+        with self.assertRaises(UnsatisfiableRequestException):
+            di.replace(newa, None)
+
+    def test_replaceviachild(self):
+        class Config:
+            def __init__(self, n): self.n = n
+        class A:
+            @types(Config)
+            def __init__(self, config): self.n = config.n
+        config = Config(1)
+        parent = DI()
+        parent.add(config)
+        parent.add(A)
+        a = DI(parent)(A)
+        self.assertIs(a, parent(A))
+        self.assertEqual([(0, 1)], parent.graph().edges)
+        parent.replace(config, Config(2))
+        self.assertEqual(2, parent(A).n)
+
+    def test_discard(self):
+        disposed = []
+        class D:
+            def dispose(self): disposed.append(self.__class__.__name__)
+        class A(D):
+            @types()
+            def __init__(self): pass
+        class B(D):
+            @types(A)
+            def __init__(self, a): self.a = a
+        class C(D):
+            @types(B)
+            def __init__(self, b): self.b = b
+        class E(D):
+            @types(A)
+            def __init__(self, a): pass
+        di = DI()
+        for cls in E, C, B, A:
+            di.add(cls)
+        c, e = di(C), di(E)
+        di.discard(B)
+        self.assertEqual(['C', 'B'], disposed)
+        self.assertIs(e, di(E))
+        newc = di(C)
+        self.assertIsNot(c, newc)
+        self.assertIsNot(c.b, newc.b)
+        self.assertIs(c.b.a, newc.b.a)
+        di.discard([D])
+        self.assertEqual(['C', 'B', 'E', 'C', 'B', 'A'], disposed)
+        di.discardall()
+        self.assertEqual(['C', 'B', 'E', 'C', 'B', 'A'], disposed)
+
+class TestRef(TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+        with open(os.path.join(self.tempdir, 'diapyrlazymod.py'), 'w') as f:
+            f.write("""from diapyr import types
+class Heavy:
+    @types()
+    def __init__(self): pass
+    class Inner: pass
+class Product: pass
+""")
+        sys.path.insert(0, self.tempdir)
+
+    def tearDown(self):
+        sys.path.remove(self.tempdir)
+        sys.modules.pop('diapyrlazymod', None)
+        shutil.rmtree(self.tempdir)
+
+    def test_lazy(self):
+        class A:
+            @types('diapyrlazymod.Heavy', ['diapyrlazymod.Heavy'], Ref('diapyrlazymod:Heavy.Inner'))
+            def __init__(self, heavy, heavies, inner = None):
+                self.heavy = heavy
+                self.heavies = heavies
+                self.inner = inner
+        di = DI()
+        di.add(A)
+        self.assertNotIn('diapyrlazymod', sys.modules)
+        with self.assertRaises(UnsatisfiableRequestException):
+            di(A)
+        self.assertIn('diapyrlazymod', sys.modules)
+        from diapyrlazymod import Heavy, Product
+        @types(A, this = 'diapyrlazymod.Product') # Resolved on add.
+        def product(a): return a
+        di.add(Heavy)
+        di.add(product)
+        a = di(A)
+        self.assertIs(Heavy, a.heavy.__class__)
+        self.assertEqual([a.heavy], a.heavies)
+        self.assertIs(None, a.inner)
+        self.assertIs(a, di(Product))
+        self.assertIs(a, di('diapyrlazymod.Product'))
+
 class TestProxy(DebugCase):
 
     class B: pass
@@ -0,0 +1,69 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+from .diapyr import DI, types
+from .graph import Graph
+from .iface import Special
+from collections import OrderedDict
+from unittest import TestCase
+import json
+
+strlabel = Special.gettypelabel(str) # Differs on Python 2.
+
+class Node:
+
+    def __init__(self, typelabel):
+        self.typelabel = typelabel
+
+class TestGraph(TestCase):
+
+    def test_export(self):
+        class A:
+            @types(str)
+            def __init__(self, s): pass
+        class B:
+            @types(A, str)
+            def __init__(self, a, s): pass
+        di = DI()
+        di.add('config')
+        di.add(A)
+        di.add(B)
+        di(B)
+        graph = di.graph()
+        self.assertEqual(['diapyr.test_graph.B', 'diapyr.test_graph.A', strlabel], [s.typelabel for s in graph.sources])
+        self.assertEqual([(0, 1), (0, 2), (1, 2)], graph.edges)
+        self.assertEqual(0, graph.seconds[2])
+        obj = json.loads(graph.tojson())
+        self.assertEqual(['diapyr.test_graph.B', 'diapyr.test_graph.A', strlabel], [n['label'] for n in obj['nodes']])
+        self.assertEqual([[0, 1], [0, 2], [1, 2]], obj['edges'])
+        dot = graph.todot().splitlines()
+        self.assertEqual('digraph {', dot[0])
+        self.assertTrue(dot[1].startswith('    0 [label="diapyr.test_graph.B\\n'))
+        self.assertEqual(['    0 -> 1;', '    0 -> 2;', '    1 -> 2;', '}'], dot[-4:])
+        di.discardall()
+        self.assertEqual([], di.graph().sources)
+
+    def test_criticalpath(self):
+        a, b, c, d = map(Node, 'abcd')
+        graph = Graph(OrderedDict([(d, [b, c]), (b, [a]), (c, [a])]), {a: 1, b: 2, c: 5, d: 1})
+        self.assertEqual([('a', 1), ('c', 5), ('d', 1)], graph.criticalpath())
+        self.assertEqual('''1.000000s a
+5.000000s c
+1.000000s d
+7.000000s total
+''', graph.criticalpathreport())
+        self.assertEqual([], Graph({}, {}).criticalpath())
@@ -0,0 +1,101 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+from .diapyr import DI, types
+from .iface import UnsatisfiableRequestException
+from unittest import TestCase
+import threading, time
+
+class Config:
+
+    suffix = '.example.com'
+
+class Client:
+
+    def __init__(self, host, disposed):
+        self.host = host
+        self.disposed = disposed
+
+    def dispose(self):
+        self.disposed.append(self.host)
+
+class TestKeyed(TestCase):
+
+    def test_lru(self):
+        disposed = []
+        @types(Config, this = Client)
+        def client(region, config):
+            return Client(region + config.suffix, disposed)
+        di = DI()
+        di.add(Config())
+        di.addkeyedfactory(client, 2)
+        eu = di(Client, key = 'eu')
+        self.assertEqual('eu.example.com', eu.host)
+        self.assertIs(eu, di(Client, key = 'eu'))
+        us = di(Client, key = 'us')
+        self.assertIs(eu, di(Client, key = 'eu'))
+        self.assertEqual([], disposed)
+        di(Client, key = 'ap') # Evicts us.
+        self.assertEqual(['us.example.com'], disposed)
+        self.assertIsNot(us, di(Client, key = 'us'))
+        self.assertEqual(['us.example.com', 'eu.example.com'], disposed)
+        info = di.cacheinfo(Client)
+        self.assertEqual((2, 4, 2, 2, 2), info)
+        self.assertEqual(2, info.hits)
+        di.discardall()
+        self.assertEqual(['us.example.com', 'eu.example.com', 'us.example.com', 'ap.example.com'], disposed)
+        self.assertEqual(0, di.cacheinfo(Client).currsize)
+
+    def test_child(self):
+        @types(this = Client)
+        def client(key):
+            return Client(key, None)
+        di = DI()
+        di.addkeyedfactory(client)
+        child = DI(di)
+        self.assertIs(di(Client, key = 1), child(Client, key = 1))
+        with self.assertRaises(UnsatisfiableRequestException):
+            child(Config, key = 1)
+        with self.assertRaises(UnsatisfiableRequestException):
+            di(Client)
+
+    def test_maxsize(self):
+        @types(this = Client)
+        def client(key):
+            return Client(key, None)
+        with self.assertRaises(ValueError):
+            DI().addkeyedfactory(client, 0)
+
+    def test_concurrentmiss(self):
+        created = []
+        @types(this = Client)
+        def client(key):
+            time.sleep(.05) # Give the other thread a chance to miss too.
+            created.append(key)
+            return Client(key, None)
+        di = DI()
+        di.addkeyedfactory(client)
+        clients = []
+        def get():
+            clients.append(di(Client, key = 'eu'))
+        threads = [threading.Thread(target = get) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(['eu'], created)
+        self.assertIs(clients[0], clients[1])
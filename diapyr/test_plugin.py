@@ -0,0 +1,144 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+from .diapyr import DI, types
+from .start import Started
+from .util import ispy2
+from tempfile import mkdtemp
+from unittest import TestCase
+import os, shutil, sys, threading, time
+
+class Storage: pass
+
+class Codec: pass
+
+class Both(Storage, Codec):
+
+    @types()
+    def __init__(self): pass
+
+class TestDiscover(TestCase):
+
+    def setUp(self):
+        if ispy2 or sys.version_info < (3, 8):
+            self.skipTest('Requires importlib.metadata.')
+        self.tempdir = mkdtemp()
+        self._distribution('dummystorage', '''from diapyr import types
+from diapyr.test_plugin import Codec, Storage
+class DiskStorage(Storage):
+    @types([Codec])
+    def __init__(self, codecs): self.codecs = codecs
+''', '''[diapyr.test]
+diapyr.test_plugin.Storage = dummystorage:DiskStorage
+''')
+        self._distribution('dummycodec', '''from diapyr import types
+from diapyr.test_plugin import Codec
+class Zip(Codec):
+    @types()
+    def __init__(self): pass
+class Gzip(Codec):
+    @types()
+    def __init__(self): pass
+''', '''[diapyr.test]
+diapyr.test_plugin.Codec = dummycodec:Zip
+diapyr.test_plugin:Codec = dummycodec:Gzip
+''')
+        self._distribution('dummyother', 'raise Exception', '''[diapyr.test]
+diapyr.test_plugin.TestDiscover = dummyother:Unused
+''')
+        sys.path.insert(0, self.tempdir)
+
+    def _distribution(self, name, source, entrypoints):
+        with open(os.path.join(self.tempdir, name + '.py'), 'w') as f:
+            f.write(source)
+        infodir = os.path.join(self.tempdir, name + '-1.0.dist-info')
+        os.mkdir(infodir)
+        with open(os.path.join(infodir, 'METADATA'), 'w') as f:
+            f.write("Metadata-Version: 2.1\nName: %s\nVersion: 1.0\n" % name)
+        with open(os.path.join(infodir, 'entry_points.txt'), 'w') as f:
+            f.write(entrypoints)
+
+    def tearDown(self):
+        sys.path.remove(self.tempdir)
+        for name in 'dummystorage', 'dummycodec', 'dummyother', 'dummyflaky':
+            sys.modules.pop(name, None)
+        shutil.rmtree(self.tempdir)
+
+    def test_discover(self):
+        di = DI()
+        di.discover('diapyr.test')
+        self.assertFalse(any(name in sys.modules for name in ['dummystorage', 'dummycodec', 'dummyother']))
+        self.assertEqual([], di.all(Started))
+        self.assertFalse(any(name in sys.modules for name in ['dummystorage', 'dummycodec', 'dummyother']))
+        storages = di.all(Storage)
+        self.assertEqual(['DiskStorage'], [s.__class__.__name__ for s in storages])
+        self.assertEqual(['Gzip', 'Zip'], sorted(c.__class__.__name__ for c in di.all(Codec)))
+        self.assertIs(storages[0], di(Storage))
+        self.assertEqual(['Gzip', 'Zip'], sorted(c.__class__.__name__ for c in storages[0].codecs))
+        self.assertNotIn('dummyother', sys.modules)
+        self.assertEqual([], di.all(Storage)[1:])
+
+    def test_nodoubleadd(self):
+        di = DI()
+        di.defer('diapyr.test_plugin.Storage', 'diapyr.test_plugin.Both')
+        di.defer('diapyr.test_plugin.Codec', 'diapyr.test_plugin:Both')
+        di.defer('diapyr.test_plugin.Codec', 'diapyr.test_plugin.Both')
+        self.assertEqual([Both], [s.__class__ for s in di.all(Storage)])
+        self.assertEqual([Both], [c.__class__ for c in di.all(Codec)])
+
+    def test_retryfailedimport(self):
+        path = os.path.join(self.tempdir, 'dummyflaky.py')
+        with open(path, 'w') as f:
+            f.write('raise ImportError')
+        di = DI()
+        di.defer('diapyr.test_plugin.Codec', 'dummyflaky.Flaky')
+        with self.assertRaises(ImportError):
+            di.all(Codec)
+        sys.modules.pop('dummyflaky', None)
+        with open(path, 'w') as f:
+            f.write('''from diapyr import types
+from diapyr.test_plugin import Codec
+class Flaky(Codec):
+    @types()
+    def __init__(self): pass
+''')
+        self.assertEqual(['Flaky'], [c.__class__.__name__ for c in di.all(Codec)])
+        self.assertEqual(1, len(di.all(Codec)))
+
+    def test_concurrentfirstlookup(self):
+        di = DI()
+        di.defer('diapyr.test_plugin.Codec', 'diapyr.test_plugin.Both')
+        add = di.add
+        def slowadd(obj):
+            time.sleep(.05) # Give the other thread a chance to get past its check.
+            add(obj)
+        di.add = slowadd
+        barrier = threading.Barrier(2)
+        errors = []
+        def lookup():
+            barrier.wait()
+            try:
+                di.all(Codec)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target = lookup) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual([], errors)
+        self.assertEqual([Both], [c.__class__ for c in di.all(Codec)])
@@ -0,0 +1,78 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+from .diapyr import DI, types
+from tempfile import mkdtemp
+from unittest import TestCase
+import os, shutil
+
+def expensive():
+    return sum(range(100000))
+
+def cheap():
+    pass
+
+class Cheap(object):
+
+    @types()
+    def __init__(self):
+        cheap()
+
+class Expensive(object):
+
+    @types(Cheap)
+    def __init__(self, cheap):
+        expensive()
+
+    @types()
+    def enhance(self):
+        expensive()
+
+class Product(object): pass
+
+@types(Expensive, this = Product)
+def product(e):
+    return Product()
+
+class TestProfiler(TestCase):
+
+    def test_profile(self):
+        di = DI()
+        profiler = di.profile()
+        self.assertIs(profiler, di.profile())
+        di.add(Cheap)
+        di.add(Expensive)
+        di.add(product)
+        di(Product)
+        labels = [label for label, _ in profiler.ranked()]
+        self.assertEqual('diapyr.test_profiling.Expensive', labels[0])
+        self.assertEqual(['diapyr.test_profiling.Cheap', 'diapyr.test_profiling.Expensive', 'diapyr.test_profiling.Product'], sorted(labels))
+        def calls(label, name):
+            return sum(v[0] for k, v in profiler.stats[label].stats.items() if k[2] == name)
+        self.assertEqual(2, calls('diapyr.test_profiling.Expensive', 'expensive'))
+        self.assertEqual(0, calls('diapyr.test_profiling.Expensive', 'cheap'))
+        self.assertEqual(1, calls('diapyr.test_profiling.Cheap', 'cheap'))
+        report = profiler.report()
+        self.assertTrue(report.startswith('0.'))
+        self.assertIn('s diapyr.test_profiling.Expensive\n', report)
+        self.assertIn('(expensive)', report)
+        tempdir = mkdtemp()
+        try:
+            profiler.dump(tempdir)
+            self.assertEqual(['diapyr.test_profiling.Cheap.pstats', 'diapyr.test_profiling.Expensive.pstats', 'diapyr.test_profiling.Product.pstats'], sorted(os.listdir(tempdir)))
+        finally:
+            shutil.rmtree(tempdir)
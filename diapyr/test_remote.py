@@ -0,0 +1,100 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+from .diapyr import DI, types
+from .start import Started
+from .util import ispy2
+from tempfile import mkdtemp
+from unittest import TestCase
+import os, shutil
+
+class Summary:
+
+    def __init__(self, text):
+        self.text = text
+
+class Scorer:
+
+    @types(int, str)
+    def __init__(self, factor, path):
+        self.factor = factor
+        self.path = path
+
+    @types(float)
+    def __enhance(self, offset): # Mangled.
+        self.offset = offset
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+
+    def isrunning(self):
+        return self.running
+
+    @types(str, this = Summary)
+    def __summary(self, path): # Mangled.
+        return Summary("%s %s" % (self.factor, os.getpid()))
+
+    def score(self, x, scale = 1):
+        return (self.factor * x + self.offset) * scale, os.getpid()
+
+    def dispose(self):
+        with open(self.path, 'w') as f:
+            f.write('disposed')
+
+class Ranker:
+
+    @types(Scorer)
+    def __init__(self, scorer):
+        self.scorer = scorer
+
+class TestRemote(TestCase):
+
+    def setUp(self):
+        if ispy2:
+            self.skipTest('Requires concurrent.futures.')
+        self.tempdir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_works(self):
+        path = os.path.join(self.tempdir, 'dispose')
+        with DI() as di:
+            di.add(3)
+            di.add(path)
+            di.add(.5)
+            di.addremote(Scorer)
+            di.add(Ranker)
+            scorer = di(Ranker).scorer
+            started, = di.all(Started)
+            self.assertIs(scorer, started.startable)
+            self.assertTrue(scorer.isrunning())
+            value, pid = scorer.score(2, scale = 2)
+            self.assertEqual(13, value)
+            self.assertNotEqual(os.getpid(), pid)
+            self.assertEqual(pid, scorer.score(1)[1])
+            self.assertEqual("3 %s" % pid, di(Summary).text)
+            with self.assertRaises(AttributeError):
+                scorer.factor
+            self.assertFalse(os.path.exists(path))
+        with open(path) as f:
+            self.assertEqual('disposed', f.read())
+        with self.assertRaises(RuntimeError):
+            scorer.score(1)
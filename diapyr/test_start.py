@@ -16,8 +16,11 @@
 # along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
 
 from .diapyr import DI, types
+from .iface import TimeoutException
 from .start import starter, Started
+from .util import ispy2
 from unittest import TestCase
+import threading
 
 class TestStarted(TestCase):
 
@@ -68,3 +71,122 @@ class TestStarted(TestCase):
         di.add(B)
         di.add(C)
         self.assertEqual([A, C], [obj.startable.__class__ for obj in di.all(Started)])
+
+class TestConcurrent(TestCase):
+
+    def setUp(self):
+        if ispy2:
+            self.skipTest('Requires concurrent.futures.')
+        from concurrent.futures import ThreadPoolExecutor
+        self.executor = ThreadPoolExecutor(4)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_startstopconcurrently(self):
+        barrier = threading.Barrier(2, timeout = 5)
+        events = []
+        class A:
+            @types()
+            def __init__(self): pass
+            def start(self):
+                barrier.wait() # Deadlocks unless both start together.
+                events.append('start')
+            def stop(self):
+                barrier.wait()
+                events.append('stop')
+        class B(A): pass
+        di = DI(executor = self.executor)
+        di.add(A)
+        di.add(B)
+        self.assertEqual([A, B], [s.startable.__class__ for s in di.all(Started)])
+        self.assertEqual(['start', 'start'], events)
+        di.discardall()
+        self.assertEqual(['start', 'start', 'stop', 'stop'], events)
+        di.discardall()
+        self.assertEqual(['start', 'start', 'stop', 'stop'], events)
+
+    def test_dependencyorder(self):
+        events = []
+        class A:
+            @types()
+            def __init__(self): pass
+            def start(self): events.append('A.start')
+            def stop(self): events.append('A.stop')
+        class B:
+            @types(starter(A))
+            def __init__(self, astarter): pass
+            def start(self): events.append('B.start')
+            def stop(self): events.append('B.stop')
+        di = DI(executor = self.executor)
+        di.add(A)
+        di.add(B)
+        di.all(Started)
+        self.assertEqual(['A.start', 'B.start'], events)
+        di.discardall()
+        self.assertEqual(['A.start', 'B.start', 'B.stop', 'A.stop'], events)
+
+    def test_parent(self):
+        events = []
+        class A:
+            @types()
+            def __init__(self): pass
+            def start(self): events.append('start')
+            def stop(self): events.append('stop')
+        parent = DI(executor = self.executor)
+        parent.add(A)
+        child = DI(parent, executor = self.executor)
+        child(starter(A))
+        self.assertEqual(['start'], events)
+        child.discardall()
+        self.assertEqual(['start'], events)
+        parent.discardall()
+        self.assertEqual(['start', 'stop'], events)
+
+    def test_timeouts(self):
+        release = threading.Event()
+        class Slow:
+            starttimeout = stoptimeout = .1
+            @types()
+            def __init__(self): pass
+            def start(self): release.wait(5)
+            def stop(self): release.wait(5)
+        class Fast:
+            @types()
+            def __init__(self): pass
+            def start(self): pass
+            def stop(self): pass
+        di = DI(executor = self.executor)
+        di.add(Slow)
+        di.add(Fast)
+        with self.assertRaises(TimeoutException) as cm:
+            di.all(Started)
+        self.assertEqual(("Failed to start within 0.1s: Started[diapyr.test_start.Slow]",), cm.exception.args)
+        release.set()
+        self.assertEqual([Slow, Fast], [s.startable.__class__ for s in di.all(Started)])
+        release.clear()
+        with self.assertRaises(TimeoutException) as cm:
+            di.discardall()
+        self.assertEqual(("Failed to stop within 0.1s: Started[diapyr.test_start.Slow]",), cm.exception.args)
+        release.set()
+
+    def test_retryaftertimeout(self):
+        release = threading.Event()
+        events = []
+        class Slow:
+            starttimeout = .05
+            @types()
+            def __init__(self): pass
+            def start(self):
+                release.wait(5)
+                events.append('start')
+            def stop(self): events.append('stop')
+        di = DI(executor = self.executor)
+        di.add(Slow)
+        for _ in range(2):
+            with self.assertRaises(TimeoutException):
+                di.all(Started)
+        release.set()
+        self.assertEqual([Slow], [s.startable.__class__ for s in di.all(Started)])
+        di.discardall()
+        self.assertEqual(['start', 'stop'], events)
@@ -0,0 +1,97 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+from .diapyr import DI, types
+from .iface import Special
+from tempfile import mkdtemp
+from unittest import TestCase
+import os, shutil
+
+strlabel = Special.gettypelabel(str) # Differs on Python 2.
+
+class A:
+
+    @types()
+    def __init__(self): pass
+
+    def dispose(self): pass
+
+class B:
+
+    @types(A, str)
+    def __init__(self, a, s): pass
+
+class TestStats(TestCase):
+
+    def test_stats(self):
+        di = DI()
+        di.add(A)
+        di.add('woo')
+        child = DI(DI(di))
+        child.add(B)
+        child(B)
+        child(B)
+        di(A)
+        stats = child.stats()
+        self.assertEqual(2, stats['resolutions'])
+        self.assertEqual(2, stats['plans'])
+        self.assertEqual(2, stats['hits']) # The str, then B.
+        self.assertEqual(1, stats['constructions']) # Only B is created by child.
+        self.assertEqual(1, stats['live'])
+        self.assertEqual(4, stats['lookups'])
+        self.assertEqual(4, stats['parenthops'])
+        self.assertEqual(2, stats['maxparentdepth'])
+        self.assertEqual([strlabel, 'diapyr.test_stats.B'], list(stats['sources']))
+        self.assertEqual(1, stats['sources']['diapyr.test_stats.B']['constructions'])
+        self.assertEqual(1, stats['sources'][strlabel]['hits'])
+        self.assertEqual(1, stats['sources']['diapyr.test_stats.B']['hits'])
+        stats = di.stats()
+        self.assertEqual(1, stats['resolutions'])
+        self.assertEqual(1, stats['constructions']) # A is owned by di even though the child session created it.
+        self.assertEqual(1, stats['live'])
+        self.assertEqual(1, stats['sources']['diapyr.test_stats.A']['constructions'])
+        di.discardall()
+        stats = di.stats()
+        self.assertEqual(0, stats['live'])
+        self.assertEqual(1, stats['disposals'])
+        self.assertEqual(1, stats['sources']['diapyr.test_stats.A']['disposals'])
+        di.override(A, A())
+        self.assertEqual(['diapyr.test_stats.A'], list(di.metrics.sources)) # Not the removed source.
+
+    def test_prometheus(self):
+        di = DI()
+        di.add(A)
+        di(A)
+        text = di.prometheus()
+        self.assertIn('''# HELP diapyr_resolutions_total Matches resolved by sessions.
+# TYPE diapyr_resolutions_total counter
+diapyr_resolutions_total 1
+''', text)
+        self.assertIn('''# TYPE diapyr_live gauge
+diapyr_live 1
+''', text)
+        self.assertIn('''diapyr_source_constructions_total{source="diapyr.test_stats.A"} 1
+''', text)
+        tempdir = mkdtemp()
+        try:
+            path = os.path.join(tempdir, 'diapyr.prom')
+            di.writeprometheus(path, 'app')
+            self.assertEqual(['diapyr.prom'], os.listdir(tempdir))
+            with open(path) as f:
+                self.assertIn('app_live 1\n', f.read())
+        finally:
+            shutil.rmtree(tempdir)
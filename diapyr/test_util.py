@@ -15,7 +15,8 @@
 # You should have received a copy of the GNU General Public License
 # along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
 
-from .util import enum, innerclass, invokeall, ispy2, outerzip, singleton
+from .iface import TimeoutException
+from .util import enum, executeall, innerclass, invokeall, ispy2, outerzip, singleton
 from functools import partial
 from unittest import TestCase
 
@@ -90,6 +91,13 @@ class TestCommon(TestCase):
         inner = self._plaininner('PlainInner2')
         self.assertEqual(200, inner.a)
 
+    def test_boundcached(self):
+        outer, other = MyOuter('x'), MyOuter('y')
+        self.assertIs(outer.PlainInner, outer.PlainInner)
+        self.assertIsNot(outer.PlainInner, outer.PlainInner2)
+        self.assertIsNot(outer.PlainInner, other.PlainInner)
+        self.assertEqual('y', other.PlainInner().baz)
+
     def test_propertyaccess(self):
         outer = MyOuter('hmm')
         inner = outer.PlainInner()
@@ -112,6 +120,18 @@ class TestCommon(TestCase):
         self.assertEqual([], list(outerzip([])))
         self.assertEqual([], list(outerzip([], [])))
         self.assertEqual([(None, 0, 3), (None, 1, None), (None, 2, None)], list(outerzip([], [0, 1, 2], [3])))
+        i = iter([5])
+        self.assertEqual([(5, 0), (None, 1)], list(outerzip(i, [0, 1])))
+        self.assertEqual([], list(i))
+
+    def test_outerzipchunked(self):
+        from array import array
+        self.assertEqual([], list(outerzip.chunked(2)))
+        self.assertEqual([], list(outerzip.chunked(2, [], [])))
+        self.assertEqual([([None, None], [0, 1], [3, None]), ([None], [2], [None])], list(outerzip.chunked(2, [], [0, 1, 2], [3])))
+        chunks = list(outerzip.chunked(3, range(4), [.5], typecode = 'd'))
+        self.assertEqual([(array('d', [0, 1, 2]), array('d', [.5, 0, 0])), (array('d', [3]), array('d', [0]))], chunks)
+        self.assertEqual([([1, 2], [3, -1])], list(outerzip.chunked(5, [1, 2], [3], fill = -1)))
 
     def test_enum(self):
         @enum(['p', 5], ['q'])
@@ -246,3 +266,38 @@ class TestInvokeAll(TestCase):
                 raise self.Y
         with ThreadPoolExecutor() as e:
             self._existingcontext(lambda: invokeall([e.submit(x).result for x in [f, g]]))
+
+class TestExecuteAll(TestCase):
+
+    def setUp(self):
+        if ispy2:
+            self.skipTest('No concurrent.futures.')
+        from concurrent.futures import ThreadPoolExecutor
+        self.executor = ThreadPoolExecutor(4)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_concurrent(self):
+        from threading import Barrier
+        barrier = Barrier(3)
+        self.assertEqual([0, 1, 2], sorted(executeall(self.executor, [barrier.wait for _ in range(3)], 5))) # Would time out if serial.
+        self.assertEqual([100, 200], executeall(self.executor, [partial(good, 100), partial(good, 200)]))
+
+    def test_fails(self):
+        e1, e2 = Exception(1), Exception(2)
+        with self.assertRaises(Exception) as cm:
+            executeall(self.executor, [partial(bad, e1), partial(good, 456), partial(bad, e2)])
+        self.assertIs(e2, cm.exception)
+        self.assertIs(e1, cm.exception.__context__)
+
+    def test_timeout(self):
+        from threading import Event
+        event = Event()
+        e1 = Exception(1)
+        try:
+            with self.assertRaises(TimeoutException) as cm:
+                executeall(self.executor, [partial(bad, e1), event.wait, partial(good, 789)], .1)
+            self.assertIs(e1, cm.exception.__context__)
+        finally:
+            event.set()
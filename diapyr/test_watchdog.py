@@ -0,0 +1,78 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+from .diapyr import DI, types
+from .watchdog import Watchdog
+from unittest import TestCase
+import threading
+
+class Log:
+
+    def __init__(self):
+        self.warnings = []
+        self.warned = threading.Event()
+
+    def debug(self, *args):
+        pass
+
+    def warning(self, *args):
+        self.warnings.append(args)
+        self.warned.set()
+
+class TestWatchdog(TestCase):
+
+    def test_slow(self):
+        log = Log()
+        class Fast:
+            @types()
+            def __init__(self): pass
+        class Stuck:
+            @types(Fast)
+            def __init__(self, fast):
+                log.warned.wait(5)
+            def dispose(self):
+                log.warned.wait(5)
+        class App:
+            @types(Stuck)
+            def __init__(self, stuck): pass
+        di = DI()
+        di.log = log
+        with di:
+            watchdog = di.watch(.05, .01)
+            self.assertIs(watchdog, di.watch(1))
+            di.add(Fast)
+            di.add(Stuck)
+            di.add(App)
+            di(App)
+            (msg, action, elapsed, label, path, stack), = log.warnings
+            self.assertEqual("Slow %s (%.3fs so far): %s via %s\n%s", msg)
+            self.assertEqual('make', action)
+            self.assertTrue(elapsed >= .05)
+            self.assertEqual('diapyr.test_watchdog.Stuck', label)
+            self.assertEqual('diapyr.test_watchdog.App > diapyr.test_watchdog.Stuck', path)
+            self.assertIn('log.warned.wait(5)', stack)
+            log.warned.clear()
+        self.assertEqual(2, len(log.warnings))
+        self.assertEqual(('discard', 'diapyr.test_watchdog.Stuck', 'diapyr.test_watchdog.Stuck'), log.warnings[1][1:2] + log.warnings[1][3:5])
+        self.assertFalse(watchdog.thread.is_alive())
+
+    def test_defaultinterval(self):
+        watchdog = Watchdog(Log(), 1)
+        try:
+            self.assertEqual(.5, watchdog.interval) # Not 0 on Python 2.
+        finally:
+            watchdog.stop()
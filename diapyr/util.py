@@ -15,8 +15,22 @@
 # You should have received a copy of the GNU General Public License
 # along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
 
+from .iface import TimeoutException
+from array import array
+from functools import partial
+from itertools import islice, repeat
 import sys
 
+try:
+    from itertools import zip_longest
+except ImportError:
+    from itertools import izip_longest as zip_longest
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
+
 ispy2 = sys.version_info.major < 3
 
 class Proxy(object):
@@ -35,8 +49,13 @@ class Proxy(object):
 def innerclass(cls):
     class InnerMeta(type):
         def __get__(self, enclosinginstance, owner):
-            clsname = (cls if self is Inner else self).__name__
-            return type(clsname, (Proxy, self), dict(_enclosinginstance = enclosinginstance))
+            bound = getattr(enclosinginstance, '__dict__', {}).setdefault('_innerclasses', {})
+            try:
+                return bound[self]
+            except KeyError:
+                clsname = (cls if self is Inner else self).__name__
+                bound[self] = boundcls = type(clsname, (Proxy, self), dict(_enclosinginstance = enclosinginstance))
+                return boundcls
     Inner = InnerMeta('Inner', (cls,), {})
     return Inner
 
@@ -45,28 +64,27 @@ def singleton(t):
 
 @singleton
 class outerzip:
-
-    class Session:
-
-        def __init__(self, iterables):
-            self.iterators = [iter(i) for i in iterables]
-
-        def row(self):
-            self.validrow = len(self.iterators)
-            for i in self.iterators:
-                try:
-                    yield next(i)
-                except StopIteration:
-                    self.validrow -= 1
-                    yield
+    '''Like zip but continue until all iterables are exhausted, filling in None for those that are.'''
 
     def __call__(self, *iterables):
-        session = self.Session(iterables)
+        return zip_longest(*iterables)
+
+    def chunked(self, size, *iterables, **kwargs):
+        '''Yield a tuple of columns per batch of up to size rows, each column a list or if typecode is given an array.array.
+        A typed column can't hold None, so fill (default 0) is used instead.'''
+        typecode = kwargs.pop('typecode', None)
+        fill = kwargs.pop('fill', None if typecode is None else 0)
+        column = list if typecode is None else partial(array, typecode)
+        iterators = [iter(i) for i in iterables]
         while True:
-            values = tuple(session.row())
-            if not session.validrow:
+            columns = [column(islice(i, size)) for i in iterators]
+            n = max([len(c) for c in columns] or [0])
+            if not n:
                 break
-            yield values
+            for c in columns:
+                if len(c) < n:
+                    c.extend(repeat(fill, n - len(c)))
+            yield tuple(columns)
 
 def enum(*lists):
     def d(cls):
@@ -101,3 +119,22 @@ def invokeall(callables):
     if failure is None:
         return values
     raise failure
+
+def executeall(executor, callables, timeout = None):
+    '''Like invokeall but run the callables concurrently on the given executor, collecting results in submission order.
+    If timeout seconds elapse in total, each callable yet to finish fails with TimeoutException and is cancelled if not started.'''
+    futures = [executor.submit(c) for c in callables]
+    if timeout is None:
+        return invokeall([f.result for f in futures])
+    from concurrent.futures import TimeoutError
+    deadline = monotonic() + timeout
+    def waiter(future):
+        def wait():
+            try:
+                return future.result(max(0, deadline - monotonic()))
+            except TimeoutError:
+                pass
+            future.cancel()
+            raise TimeoutException("Failed to complete within %ss." % timeout)
+        return wait
+    return invokeall([waiter(f) for f in futures])
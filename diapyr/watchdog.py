@@ -0,0 +1,77 @@
+# Copyright 2014, 2018, 2019, 2020, 2024 Andrzej Cichocki
+
+# This file is part of diapyr.
+#
+# diapyr is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diapyr is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import division
+from .util import monotonic
+from contextlib import contextmanager
+import sys, threading, traceback
+
+class Entry(object):
+
+    __slots__ = 'ident', 'start', 'action', 'label', 'path', 'reported'
+
+    def __init__(self, action, label, path):
+        self.ident = threading.current_thread().ident
+        self.start = monotonic()
+        self.action = action
+        self.label = label
+        self.path = path
+        self.reported = False
+
+class Watchdog:
+
+    def __init__(self, log, threshold, interval = None):
+        self.log = log
+        self.threshold = threshold
+        self.interval = threshold / 2 if interval is None else interval
+        self.inflight = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target = self._run, name = 'diapyr-watchdog')
+        self.thread.daemon = True
+        self.thread.start()
+
+    @contextmanager
+    def watching(self, action, label, path):
+        entry = Entry(action, label, path)
+        with self.lock:
+            self.inflight.add(entry)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.inflight.remove(entry)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.check()
+
+    def check(self):
+        now = monotonic()
+        with self.lock:
+            slow = [e for e in self.inflight if not e.reported and now - e.start >= self.threshold]
+            for e in slow:
+                e.reported = True
+        if slow:
+            frames = sys._current_frames()
+            for e in slow:
+                frame = frames.get(e.ident)
+                self.log.warning("Slow %s (%.3fs so far): %s via %s\n%s", e.action, now - e.start, e.label, e.path(), '' if frame is None else ''.join(traceback.format_stack(frame)).rstrip())
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
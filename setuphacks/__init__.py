@@ -16,15 +16,219 @@
 # along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
 
 from . import fakesetup
+from ast import literal_eval
+from hashlib import sha256
 from traceback import format_exception_only
-import os, subprocess, sys
+import os, shutil, subprocess, sys, tempfile
 
 class SetupException(Exception): pass
 
-def getsetupkwargs(setuppath, fields):
-    cwd, = (dict(cwd = d) if d else {} for d in [os.path.dirname(setuppath)])
-    setupkwargs = eval(subprocess.check_output([sys.executable, fakesetup.__file__, os.path.basename(setuppath)] + fields, **cwd))
+def _failure(setupkwargs):
+    # Can't simply propagate SystemExit for example:
+    return SetupException(format_exception_only(setupkwargs.__class__, setupkwargs)[-1].rstrip())
+
+def _result(text):
+    if isinstance(text, SetupException): # The worker died.
+        raise text
+    setupkwargs = eval(text)
     if isinstance(setupkwargs, BaseException):
-        # Can't simply propagate SystemExit for example:
-        raise SetupException(format_exception_only(setupkwargs.__class__, setupkwargs)[-1].rstrip())
+        raise _failure(setupkwargs)
     return setupkwargs
+
+def _text(setuppath, fields):
+    cwd, = (dict(cwd = d) if d else {} for d in [os.path.dirname(setuppath)])
+    return subprocess.check_output([sys.executable, fakesetup.__file__, os.path.basename(setuppath)] + fields, **cwd)
+
+def getsetupkwargs(setuppath, fields):
+    return _result(_text(setuppath, fields))
+
+class Worker:
+
+    def __init__(self):
+        self.process = subprocess.Popen([sys.executable, fakesetup.__file__, '--serve'], stdin = subprocess.PIPE, stdout = subprocess.PIPE)
+        self.pending = 0
+
+    def request(self, setuppath, fields):
+        dirpath, name = os.path.split(os.path.abspath(setuppath))
+        self.process.stdin.write(("%r\n" % [dirpath, name, list(fields)]).encode('utf-8'))
+        self.process.stdin.flush()
+        self.pending += 1
+
+    def response(self):
+        self.pending -= 1
+        line = self.process.stdout.readline()
+        if not line:
+            raise SetupException("Worker exited with code: %s" % self.process.wait())
+        return self.process.stdout.read(int(line)).decode('utf-8')
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.stdout.close()
+        self.process.wait()
+
+class Workers:
+    '''Long-lived fakesetup processes, so that many setup.py files can be inspected without an interpreter startup each.'''
+
+    def __init__(self, count = 1):
+        self.workers = [Worker() for _ in range(count)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def getsetupkwargsall(self, setuppaths, fields, exceptions = False):
+        '''Yield the result of getsetupkwargs for each path in order, raising SetupException at any that fails.
+        If exceptions is true, the SetupException is yielded instead so that the rest of the batch is still done.'''
+        for text in self.texts(setuppaths, fields):
+            try:
+                setupkwargs = _result(text)
+            except SetupException as e:
+                if not exceptions:
+                    raise
+                setupkwargs = e
+            yield setupkwargs
+
+    def texts(self, setuppaths, fields):
+        '''Yield the response text for each path in order, or a SetupException if its worker died.'''
+        setuppaths = list(setuppaths)
+        for w in self.workers:
+            while w.pending: # Left over from an abandoned iteration.
+                w.response()
+        n = len(self.workers)
+        for i, path in enumerate(setuppaths[:n]):
+            self.workers[i].request(path, fields)
+        for i in range(len(setuppaths)):
+            k = i % n
+            try:
+                text = self.workers[k].response()
+            except SetupException as e:
+                self.workers[k].close()
+                self.workers[k] = Worker()
+                text = e
+            finally:
+                if i + n < len(setuppaths):
+                    self.workers[k].request(setuppaths[i + n], fields)
+            yield text
+
+    def close(self):
+        for w in self.workers:
+            w.close()
+
+def getsetupkwargsall(setuppaths, fields, workers = 1, exceptions = False):
+    with Workers(workers) as w:
+        for setupkwargs in w.getsetupkwargsall(setuppaths, fields, exceptions):
+            yield setupkwargs
+
+class SetupCache:
+    '''On-disk cache of getsetupkwargs outcomes, including failures, keyed by setup.py content, fields, interpreter and the named environment variables.
+    Only results that are literals are cached, so that no eval of cache files is ever needed.'''
+
+    def __init__(self, dirpath, maxentries = 10000, environ = ()):
+        self.dirpath = dirpath
+        self.maxentries = maxentries
+        self.environ = environ
+
+    def _path(self, setuppath, fields):
+        with open(setuppath, 'rb') as f:
+            content = sha256(f.read()).hexdigest()
+        context = repr([sorted(set(fields)), sys.version, sys.executable, [[k, os.environ.get(k)] for k in sorted(self.environ)]])
+        return os.path.join(self.dirpath, content, sha256(context.encode('utf-8')).hexdigest())
+
+    def _load(self, path):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except IOError:
+            return
+        os.utime(path, None) # For eviction.
+        try:
+            if data.startswith(b'S'):
+                return False, literal_eval(data[1:].decode('utf-8'))
+            if data.startswith(b'F'):
+                return True, data[1:].decode('utf-8')
+        except (SyntaxError, UnicodeDecodeError, ValueError):
+            pass # Treat as a miss.
+
+    def _store(self, path, text):
+        if isinstance(text, SetupException):
+            return True, str(text) # Not the fault of the setup.py so not cached.
+        if not isinstance(text, bytes):
+            text = text.encode('utf-8')
+        try:
+            setupkwargs = literal_eval(text.decode('utf-8'))
+        except (SyntaxError, ValueError):
+            setupkwargs = eval(text)
+            if not isinstance(setupkwargs, BaseException):
+                return False, setupkwargs # Not a literal so not cacheable.
+            outcome = True, str(_failure(setupkwargs))
+            data = b'F' + outcome[1].encode('utf-8')
+        else:
+            outcome = False, setupkwargs
+            data = b'S' + text
+        self._write(path, data)
+        return outcome
+
+    def _write(self, path, data):
+        dirpath = os.path.dirname(path)
+        if not os.path.isdir(dirpath):
+            os.makedirs(dirpath)
+        fd, temppath = tempfile.mkstemp(dir = dirpath)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.rename(temppath, path) # Atomic, so concurrent readers see whole entries only.
+        except:
+            os.remove(temppath)
+            raise
+
+    def _prune(self):
+        entries = [os.path.join(d, name) for d, _, names in os.walk(self.dirpath) for name in names]
+        if len(entries) > self.maxentries:
+            entries.sort(key = os.path.getmtime)
+            for path in entries[:len(entries) - self.maxentries]:
+                os.remove(path)
+
+    def _outcome(self, outcome, exceptions = False):
+        failed, value = outcome
+        if failed:
+            if exceptions:
+                return SetupException(value)
+            raise SetupException(value)
+        return value
+
+    def getsetupkwargs(self, setuppath, fields):
+        path = self._path(setuppath, fields)
+        outcome = self._load(path)
+        if outcome is None:
+            outcome = self._store(path, _text(setuppath, fields))
+            self._prune()
+        return self._outcome(outcome)
+
+    def getsetupkwargsall(self, setuppaths, fields, workers = 1, exceptions = False):
+        '''Like the module function but only the cache misses are sent to the given number of workers.'''
+        setuppaths = list(setuppaths)
+        paths = [self._path(p, fields) for p in setuppaths]
+        outcomes = [self._load(p) for p in paths]
+        misses = [i for i, o in enumerate(outcomes) if o is None]
+        if misses:
+            try:
+                with Workers(min(workers, len(misses))) as w:
+                    texts = w.texts([setuppaths[i] for i in misses], fields)
+                    for i, outcome in enumerate(outcomes):
+                        if outcome is None:
+                            outcome = self._store(paths[i], next(texts))
+                        yield self._outcome(outcome, exceptions)
+            finally:
+                self._prune() # Once per batch.
+        else:
+            for outcome in outcomes:
+                yield self._outcome(outcome, exceptions)
+
+    def invalidate(self, setuppath):
+        '''Forget all outcomes for the current content of the given setup.py.'''
+        shutil.rmtree(os.path.dirname(self._path(setuppath, [])), True)
+
+    def clear(self):
+        shutil.rmtree(self.dirpath, True)
@@ -15,6 +15,7 @@
 # You should have received a copy of the GNU General Public License
 # along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
 
+from ast import literal_eval
 from contextlib import contextmanager
 from importlib import import_module
 import os, sys
@@ -38,12 +39,7 @@ def _outtoerr():
     finally:
         sys.stdout = stdout
 
-def main():
-    sys.argv.pop(0)
-    path = sys.argv[0]
-    fields = set(sys.argv[1:])
-    sys.argv[1:] = ['--name'] # Invoke as little around setup itself as possible.
-    sys.path.insert(0, os.path.dirname(path))
+def _extract(path, fields):
     stack = Stack()
     for m in 'distutils.core', 'setuptools':
         _patch(m, stack.setup)
@@ -51,10 +47,53 @@ def main():
         with _outtoerr(), open(path) as f:
             exec(f.read(), dict(__name__ = '__main__', __file__ = path))
     except BaseException as e: # Such as SystemExit for bad interpreter version.
-        sys.stdout.write(repr(e))
-    else:
-        setupkwargs, = stack
-        sys.stdout.write(repr({k: v for k, v in setupkwargs.items() if k in fields}))
+        return repr(e)
+    setupkwargs, = stack
+    return repr({k: v for k, v in setupkwargs.items() if k in fields})
+
+def _serve():
+    '''Extract from each requested setup.py in turn, undoing its effect on cwd, sys.path and sys.modules before the next.'''
+    stdin, stdout = sys.stdin, getattr(sys.stdout, 'buffer', sys.stdout)
+    for m in 'distutils.core', 'setuptools':
+        try:
+            import_module(m) # Once, so they survive the isolation.
+        except Exception:
+            pass
+    modules = set(sys.modules)
+    cwd = os.getcwd()
+    path = list(sys.path)
+    while True:
+        line = stdin.readline()
+        if not line:
+            break
+        dirpath, name, fields = literal_eval(line)
+        try:
+            os.chdir(dirpath)
+            sys.argv[:] = [name, '--name']
+            sys.path.insert(0, '')
+            try:
+                result = _extract(name, set(fields))
+            except BaseException as e:
+                result = repr(e)
+        finally:
+            os.chdir(cwd)
+            sys.path[:] = path
+            for m in set(sys.modules) - modules:
+                del sys.modules[m]
+        data = result.encode('utf-8')
+        stdout.write(('%s\n' % len(data)).encode('ascii'))
+        stdout.write(data)
+        stdout.flush()
+
+def main():
+    sys.argv.pop(0)
+    if ['--serve'] == sys.argv:
+        return _serve()
+    path = sys.argv[0]
+    fields = set(sys.argv[1:])
+    sys.argv[1:] = ['--name'] # Invoke as little around setup itself as possible.
+    sys.path.insert(0, os.path.dirname(path))
+    sys.stdout.write(_extract(path, fields))
 
 if ('__main__' == __name__):
     main()
@@ -15,10 +15,10 @@
 # You should have received a copy of the GNU General Public License
 # along with diapyr.  If not, see <http://www.gnu.org/licenses/>.
 
-from setuphacks import getsetupkwargs
-from tempfile import NamedTemporaryFile
+from setuphacks import getsetupkwargs, getsetupkwargsall, SetupCache, SetupException, Workers
+from tempfile import mkdtemp, NamedTemporaryFile
 from unittest import TestCase
-import os
+import os, shutil
 
 class TestSetupHacks(TestCase):
 
@@ -37,3 +37,105 @@ baz = 200
 setup(foo = 'bar', bar = 100, baz = baz)''')
             setup.flush()
             self.assertEqual(dict(foo = 'bar', baz = 200), getsetupkwargs(os.path.basename(setup.name), ['foo', 'baz', 'x']))
+
+    def test_getsetupkwargsall(self):
+        tempdir = mkdtemp()
+        try:
+            paths = []
+            for i in range(5):
+                d = os.path.join(tempdir, str(i))
+                os.mkdir(d)
+                paths.append(os.path.join(d, 'setup.py'))
+                with open(os.path.join(d, 'helper.py'), 'w') as f:
+                    f.write('value = %s\n' % i)
+                with open(paths[-1], 'w') as f:
+                    f.write('''from setuptools import setup
+import helper, sys
+sys.path.append('junk')
+if %s == 3: raise SystemExit('bad version')
+setup(foo = helper.value, bar = 100)''' % i)
+            expected = [dict(foo = i) for i in range(5)]
+            for workers in 1, 2:
+                with Workers(workers) as w:
+                    results = w.getsetupkwargsall(paths, ['foo'])
+                    self.assertEqual(expected[:3], [next(results) for _ in range(3)])
+                    with self.assertRaises(SetupException) as cm:
+                        next(results)
+                    self.assertEqual('SystemExit: bad version', str(cm.exception))
+                    self.assertEqual(expected[4:], list(w.getsetupkwargsall(paths[4:], ['foo'])))
+                    results = list(w.getsetupkwargsall(paths, ['foo'], True))
+                    self.assertEqual(expected[:3] + expected[4:], results[:3] + results[4:]) # Carried on after the failure.
+                    self.assertIsInstance(results[3], SetupException)
+                    self.assertEqual('SystemExit: bad version', str(results[3]))
+            with self.assertRaises(SetupException):
+                list(getsetupkwargsall(paths, ['foo']))
+            self.assertEqual(expected[:2], list(getsetupkwargsall(paths[:2], ['foo'], 2)))
+            self.assertEqual(expected[4], list(getsetupkwargsall(paths, ['foo'], exceptions = True))[4])
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_workerdied(self):
+        tempdir = mkdtemp()
+        try:
+            paths = [os.path.join(tempdir, "%s.py" % i) for i in range(3)]
+            for i, path in enumerate(paths):
+                with open(path, 'w') as f:
+                    f.write('''from setuptools import setup
+import os
+if %s == 1: os._exit(1)
+setup(foo = %s)''' % (i, i))
+            results = list(getsetupkwargsall(paths, ['foo'], exceptions = True))
+            self.assertEqual([dict(foo = 0), dict(foo = 2)], results[::2])
+            self.assertEqual('Worker exited with code: 1', str(results[1]))
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_cache(self):
+        tempdir = mkdtemp()
+        try:
+            cache = SetupCache(os.path.join(tempdir, 'cache'), maxentries = 3, environ = ['SETUPHACKS_TEST'])
+            good, bad = [os.path.join(tempdir, name) for name in ['good.py', 'bad.py']]
+            with open(good, 'w') as f:
+                f.write('''from setuptools import setup
+import os
+setup(foo = os.environ.get('SETUPHACKS_TEST'), bar = [1, {'x': (2, None)}])''')
+            with open(bad, 'w') as f:
+                f.write("raise SystemExit('bad version')")
+            def entries():
+                return sorted(name for _, _, names in os.walk(cache.dirpath) for name in names)
+            self.assertEqual(dict(foo = None, bar = [1, {'x': (2, None)}]), cache.getsetupkwargs(good, ['foo', 'bar']))
+            self.assertEqual(1, len(entries()))
+            with self.assertRaises(SetupException) as cm:
+                cache.getsetupkwargs(bad, ['foo'])
+            self.assertEqual('SystemExit: bad version', str(cm.exception))
+            self.assertEqual(2, len(entries()))
+            with open(bad, 'a') as f:
+                f.write('\n') # Different content, yet to be cached.
+            os.environ['SETUPHACKS_TEST'] = 'woo'
+            try:
+                results = cache.getsetupkwargsall([good, good, bad], ['foo'])
+                self.assertEqual([dict(foo = 'woo')] * 2, [next(results), next(results)])
+                with self.assertRaises(SetupException):
+                    next(results)
+                good2, bad2 = cache.getsetupkwargsall([good, bad], ['foo'], exceptions = True) # Both cached now.
+                self.assertEqual(dict(foo = 'woo'), good2)
+                self.assertEqual('SystemExit: bad version', str(bad2))
+            finally:
+                del os.environ['SETUPHACKS_TEST']
+            self.assertEqual(3, len(entries()))
+            cache.getsetupkwargs(good, ['bar'])
+            self.assertEqual(3, len(entries())) # Oldest was evicted.
+            with open(good) as f:
+                content = f.read()
+            with open(good, 'w') as f:
+                f.write(content.replace('setup(', 'raise Exception; setup('))
+            with self.assertRaises(SetupException):
+                cache.getsetupkwargs(good, ['bar'])
+            with open(good, 'w') as f:
+                f.write(content)
+            cache.invalidate(good)
+            self.assertEqual(dict(foo = None), next(cache.getsetupkwargsall([good], ['foo'])))
+            cache.clear()
+            self.assertEqual([], entries())
+        finally:
+            shutil.rmtree(tempdir)